@@ -3,6 +3,7 @@ from json import load, dump
 
 PROJECT_ROOT = path.abspath(path.join(path.dirname(__file__), ".."))
 RESOURCES_DIR = path.join(PROJECT_ROOT, "Resources")
+REPO_ROOT = path.dirname(PROJECT_ROOT)
 
 def load_config(config_file):
     config_path = path.join(RESOURCES_DIR, config_file)
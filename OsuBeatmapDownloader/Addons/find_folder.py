@@ -1,7 +1,15 @@
 import os
+import sys
 import string
 from pathlib import Path
-from Addons.config import save_config, load_config
+from Addons.config import REPO_ROOT, save_config, load_config
+
+sys.path.insert(0, REPO_ROOT)
+from osu_library import profiling
+try:
+    from osu_library.index_service import IndexClient
+except ImportError:  # the index service needs numpy
+    IndexClient = None
 
 
 def find_folder(folder_name, subfolder_name, os_name, json_index, config_file):
@@ -11,6 +19,15 @@ def find_folder(folder_name, subfolder_name, os_name, json_index, config_file):
         print(f"✅ Using saved osu_path from {config_file}")
         return configuration[json_index]
 
+    # A running index service already knows where osu! is
+    client = IndexClient.connect() if IndexClient else None
+    if client:
+        client.close()
+        print(f"✅ Using the osu! folder of the index service: {client.osu_folder}")
+        configuration[json_index] = client.osu_folder
+        save_config(configuration, config_file)
+        return client.osu_folder
+
     if os_name == "Windows":
         start_paths = [f"{u}:/" for u in string.ascii_uppercase if os.path.exists(f"{u}:/")]
         print("Detected Windows drives:", start_paths)
@@ -20,8 +37,14 @@ def find_folder(folder_name, subfolder_name, os_name, json_index, config_file):
         start_paths = [home, "/"]
         print("Scanning:", start_paths)
 
+    with profiling.span("find osu folder"):
+        return _walk_for_folder(start_paths, folder_name, subfolder_name, json_index, configuration)
+
+
+def _walk_for_folder(start_paths, folder_name, subfolder_name, json_index, configuration):
     for base_path in start_paths:
         for root, dirs, _ in os.walk(base_path):
+            profiling.count("directories listed")
             if folder_name in dirs:
                 parent_path = os.path.join(root, folder_name)
                 child_path = os.path.join(parent_path, subfolder_name)
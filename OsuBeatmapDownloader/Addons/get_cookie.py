@@ -9,12 +9,14 @@ def get_cookie(config_file,
                css_query,
                cookie_name="osu_session",
                url="https://osu.ppy.sh/",
+               json_index=None,
                ):
     configuration = config.load_config(config_file)
+    json_index = json_index or cookie_name
 
-    if cookie_name in configuration:
-        print(f"✅ Using saved {cookie_name} from {config_file}")
-        return configuration[cookie_name]
+    if json_index in configuration:
+        print(f"✅ Using saved {json_index} from {config_file}")
+        return configuration[json_index]
 
     driver = Driver(uc=True)
     print("Driver:", driver)
@@ -46,7 +48,7 @@ def get_cookie(config_file,
     if cookie:
         print(f"\n✅ {cookie_name} cookie found. Saving to config...")
         print(f"{cookie_name}:", cookie)
-        configuration[cookie_name] = cookie
+        configuration[json_index] = cookie
 
         config.save_config(configuration, config_file)
         return cookie
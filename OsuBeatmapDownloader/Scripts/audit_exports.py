@@ -0,0 +1,90 @@
+import os
+from re import match
+from json import load, dump
+from pathlib import Path
+from zipfile import ZipFile
+from concurrent.futures import ProcessPoolExecutor
+
+AUDIT_FILE = ".osz_audit.json"
+CORRUPT_FOLDER = "Corrupt"
+
+
+def check_archive(archive_path):
+    # Full CRC test of every member, and at least one .osu must be present
+    try:
+        with ZipFile(archive_path) as zf:
+            bad_member = zf.testzip()
+            if bad_member:
+                return f"CRC error in {bad_member}"
+            if not any(name.lower().endswith(".osu") for name in zf.namelist()):
+                return "No .osu file in archive"
+    except Exception as e:
+        # Anything a damaged archive can raise (BadZipFile, zlib.error, unsupported compression...) fails
+        # this archive only, so one bad file can't stop the audit of the others
+        return str(e) or type(e).__name__
+    return None
+
+
+def load_audit(audit_path):
+    if audit_path.exists():
+        try:
+            with open(audit_path, "r", encoding="utf-8") as f:
+                return load(f)
+        except Exception as e:
+            print("Error loading audit file:", e)
+    return {}
+
+
+def save_audit(results, audit_path):
+    tmp_path = audit_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        dump(results, f, indent=4)
+    tmp_path.replace(audit_path)
+
+
+def audit_exports(osu_path, workers=None):
+    exports = Path(osu_path) / "Exports"
+    audit_path = exports / AUDIT_FILE
+    results = load_audit(audit_path)
+
+    archives = {p.name: p.stat() for p in exports.glob("*.osz")}
+    results = {name: r for name, r in results.items() if name in archives}
+
+    # Only archives that are new or changed since the last audit are tested again
+    pending = [
+        name for name, st in archives.items()
+        if name not in results or results[name]["size"] != st.st_size or results[name]["mtime"] != st.st_mtime
+    ]
+    print(f"Auditing {len(pending)} archives ({len(archives) - len(pending)} unchanged)...")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, error in zip(pending, pool.map(check_archive, [exports / n for n in pending], chunksize=4)):
+            results[name] = {"size": archives[name].st_size, "mtime": archives[name].st_mtime, "error": error}
+            if error:
+                print(f"✖ {name}: {error}")
+
+    save_audit(results, audit_path)
+
+    failed = {name: r["error"] for name, r in results.items() if r["error"]}
+    print(f"Audit complete: {len(results) - len(failed)} valid, {len(failed)} failed")
+    return failed
+
+
+def requeue_failed(osu_path, failed):
+    # Moves broken archives aside and returns download links for their beatmapsets
+    exports = Path(osu_path) / "Exports"
+    corrupt = exports / CORRUPT_FOLDER
+    corrupt.mkdir(exist_ok=True)
+
+    links = []
+    for name in failed:
+        archive = exports / name
+        if archive.exists():
+            os.replace(archive, corrupt / name)
+
+        if m := match(r"(\d+)", name):
+            links.append(f"https://osu.ppy.sh/beatmapsets/{m.group(1)}")
+        else:
+            print(f"Could not extract beatmapset_id from: {name}")
+
+    return links
@@ -0,0 +1,38 @@
+from pathlib import Path
+from Utils.dedup_index import DedupIndex, pick_canonical, replace_with_link
+
+
+def dedup_exports(osu_path, remove=False):
+    # Replaces identical copies of a beatmapset archive with hardlinks, or removes them
+    index = DedupIndex(Path(osu_path) / "Exports")
+    saved = 0
+    handled = 0
+
+    for names in list(index.groups()):
+        canonical = pick_canonical(names, index.entries)
+        canonical_path = index.exports / canonical
+
+        for name in names:
+            entry = index.entries[name]
+            if name == canonical or entry["inode"] == index.entries[canonical]["inode"]:
+                continue
+
+            duplicate = index.exports / name
+            try:
+                if remove:
+                    duplicate.unlink()
+                    print(f"✖ Removed duplicate {name} (same as {canonical})")
+                else:
+                    replace_with_link(canonical_path, duplicate)
+                    print(f"🔗 Linked duplicate {name} -> {canonical}")
+            except OSError as e:
+                print(f"Error deduplicating {name}: {e}")
+                continue
+
+            saved += entry["size"]
+            handled += 1
+
+    index.refresh()
+    index.save()
+    print(f"Dedup complete: {handled} duplicates, {saved / 1024 / 1024:.1f} MB reclaimed")
+    return index
\ No newline at end of file
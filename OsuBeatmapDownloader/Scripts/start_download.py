@@ -1,18 +1,221 @@
-from requests import Session
+import sys
+from contextlib import nullcontext, redirect_stdout
+from time import monotonic
+from queue import Empty, Queue
+from threading import Lock, Thread
 from pathlib import Path
-from Utils.osu_utils import extract_id, try_sources
+from Utils.osu_utils import SEGMENT_THRESHOLD, SEGMENTS, SessionError, extract_id, try_sources
+from Utils.dedup_index import DedupIndex
+from Utils.run_report import RunReport
+from Utils.progress import ProgressAggregator, TerminalBar
+from Utils.scheduler import SizeCache, probe_sizes, schedule
+from Utils.session_pool import MAX_IN_FLIGHT, NoSessionsLeft, SessionPool
+from Utils.watchdog import STALL_FLOOR, DownloadCancelled, HedgedDownload
+from Addons.config import REPO_ROOT
 
-def start_download(osu_session, osu_path, links):
+sys.path.insert(0, REPO_ROOT)
+from osu_library import profiling
+
+HEDGE_CHECK_INTERVAL = 1.0  # how often idle workers look for a download to hedge
+HEDGE_MIN_AGE = 5.0         # seconds a download runs before it can be hedged
+HEDGE_MIN_ETA = 10.0        # only downloads expected to take longer than this are hedged
+
+
+def installed_set_ids(osu_path):
+    # Beatmapset ids already in Songs or Exports, from the index service or an in-process index
+    from osu_library.index_service import open_index
+    index = open_index(osu_path)
+    set_ids = index.set_ids()
+    if hasattr(index, "close"):
+        index.close()
+    return set_ids
+
+
+def start_download(osu_session, osu_path, links, dedup=False, no_video=False, progress=None,
+                   schedule_policy="file", probe=False, skip_installed=False, hedge=False, stall_floor=STALL_FLOOR,
+                   segments=SEGMENTS, segment_threshold=SEGMENT_THRESHOLD, skip_same_size=False):
     print("Starting download...")
     if not osu_session or not osu_path or not links:
         raise RuntimeError("Error some arguments are missing to start download.")
 
-    session = Session()
-    session.cookies.set("osu_session", osu_session)
+    # Either one osu_session cookie or a dict of named account cookies
+    cookies = osu_session if isinstance(osu_session, dict) else {"osu_session": osu_session}
+    pool = SessionPool(cookies)
+    if not len(pool):
+        raise RuntimeError("Error no valid osu_session cookie to start download.")
+
+    exports = Path(osu_path) / "Exports"
+    dedup_index = DedupIndex(exports) if dedup else None
+    report = RunReport()
+    queue = Queue()
 
+    # Lists often link several difficulties of one mapset; two workers on the same beatmapset would write the
+    # same temporary file, so each beatmapset is queued once
+    seen = set()
+    unique = []
     for link in links:
+        try:
+            set_id = extract_id(link)
+        except ValueError:
+            unique.append(link)  # reported as failed by the worker
+            continue
+        if set_id in seen:
+            report.add("skipped_repeats")
+            continue
+        seen.add(set_id)
+        unique.append(link)
+    links = unique
+
+    if skip_installed:
+        installed = installed_set_ids(osu_path)
+        remaining = []
+        for link in links:
+            try:
+                if int(extract_id(link)) in installed:
+                    report.add("skipped_installed")
+                    continue
+            except ValueError:
+                pass
+            remaining.append(link)
+        links = remaining
+
+    # Archive sizes known from earlier runs (or probed) decide the download order
+    sizes = SizeCache(exports)
+    if probe:
+        probe_sizes(pool, links, sizes)
+    links, summary = schedule(links, sizes, schedule_policy)
+    report.note(summary)
+
+    # One aggregator covers every concurrent download; the caller may pass its own to feed a Tk dashboard.
+    # The \r bar is only drawn on a terminal: redirected to a file or a log it would be one endless line.
+    bar = None
+    if progress is None:
+        progress = ProgressAggregator()
+        if sys.stdout.isatty():
+            bar = TerminalBar()
+            progress.subscribe(bar)
+    progress.expected = len(links)
+
+    # Downloads in flight; near the end of the batch idle workers may start a second request for the slowest
+    running = set()
+    running_lock = Lock()
+
+    def download_link(link, download, tag="main", race=None):
+        # One request for a link. The main request only returns once every request for the link has ended.
+        # Returns True when the link went back in the queue, so it isn't settled yet
+        race = race or download.attempt(tag)
+        error = None
         try:
             beatmap_id = extract_id(link)
-            try_sources(session, beatmap_id, Path(osu_path) / "Exports")
-        except Exception as e:
-            print(f"Error with the start of the download: {e}")
\ No newline at end of file
+            pooled = pool.acquire()
+        except (ValueError, NoSessionsLeft) as e:
+            download.end()
+            error = e
+        else:
+            try:
+                path = try_sources(pooled.session, beatmap_id, exports, dedup_index, no_video, report, progress,
+                                   race, stall_floor, segments, segment_threshold, skip_same_size)
+                pool.release(pooled, True)
+                if path and path.exists():
+                    sizes.record(beatmap_id, path.stat().st_size)
+                if tag == "hedge" and download.winner == tag:
+                    report.add("hedge_wins")
+            except DownloadCancelled:
+                # The other request for this link finished first
+                pool.release(pooled, True)
+            except SessionError as e:
+                pool.release(pooled, False)
+                if e.expired:
+                    pool.expire(pooled)
+                else:
+                    pool.throttle(pooled, e.retry_after)
+                error = e
+            except Exception as e:
+                pool.release(pooled, False)
+                error = e
+            finally:
+                download.end()
+
+        if tag == "hedge":
+            return
+
+        # No hedge can start from here on, and a running one finishes its rename, dedup and report
+        # before the link is marked done. A failed request only counts if no other request succeeded.
+        with running_lock:
+            running.discard(download)
+        if download.wait_all() or error is None:
+            return
+        if isinstance(error, SessionError):
+            # Another session picks the link up, the rest of the queue keeps going
+            queue.put(link)
+            return True
+        else:
+            print(f"Error with the start of the download: {error}")
+            report.add("failed")
+
+    def hedge_slowest():
+        # The queue is empty: duplicate the download expected to finish last, if it is slow enough to matter
+        with running_lock:
+            now = monotonic()
+            candidates = [d for d in running if not d.hedged and d.winner is None and now - d.started >= HEDGE_MIN_AGE]
+            download = max(candidates, key=lambda d: d.eta(), default=None)
+            if not download or download.eta() < HEDGE_MIN_ETA:
+                return
+            download.hedged = True
+            # Registered before the lock is released, so the main request waits for it
+            race = download.attempt("hedge")
+        report.add("hedged_requests")
+        download_link(download.link, download, "hedge", race)
+
+    def worker():
+        while True:
+            try:
+                link = queue.get(timeout=HEDGE_CHECK_INTERVAL if hedge else None)
+            except Empty:
+                hedge_slowest()
+                continue
+            if link is None:
+                queue.task_done()
+                return
+
+            download = HedgedDownload(link)
+            with running_lock:
+                running.add(download)
+            requeued = False
+            try:
+                requeued = download_link(link, download)
+            finally:
+                if not requeued:
+                    progress.link_done()
+                queue.task_done()
+
+    for link in links:
+        queue.put(link)
+
+    started = monotonic()
+    # While the terminal bar is drawn, the workers' prints go through it
+    with progress, (redirect_stdout(bar) if bar else nullcontext()):
+        # Each worker runs under profiling.run, so --profile cprofile covers the downloads and not just the wait
+        workers = [Thread(target=profiling.run, args=(worker,), daemon=True) for _ in range(len(pool) * MAX_IN_FLIGHT)]
+        for thread in workers:
+            thread.start()
+
+        queue.join()
+        # Workers stop on None once every link is done, which lets the profiled ones hand in their stats
+        for _ in workers:
+            queue.put(None)
+        for thread in workers:
+            thread.join()
+    elapsed = monotonic() - started
+
+    if dedup_index:
+        dedup_index.save()
+    sizes.save()
+
+    completed = report.get("downloaded") + report.get("skipped_duplicates")
+    report.note(f"Completed {completed} maps in {elapsed:.0f}s ({completed / max(elapsed, 1) * 60:.1f} maps/min)")
+
+    for line in pool.health():
+        report.note(line)
+    report.print_summary()
+    return report
\ No newline at end of file
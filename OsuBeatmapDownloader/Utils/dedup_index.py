@@ -0,0 +1,138 @@
+import os
+from re import match
+from json import load, dump
+from hashlib import sha256
+from pathlib import Path
+from threading import RLock
+
+DEDUP_FILE = ".osz_dedup.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def archive_set_id(name):
+    if m := match(r"(\d+)", name):
+        return m.group(1)
+    return None
+
+
+def hash_file(path):
+    digest = sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DedupIndex:
+    # Content index of the Exports folder: beatmapset id -> size -> archives, hashed lazily
+
+    def __init__(self, exports):
+        self.exports = Path(exports)
+        self.index_path = self.exports / DEDUP_FILE
+        self.lock = RLock()
+        self.entries = self._load()
+        self.refresh()
+
+    def _load(self):
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    return load(f)
+            except Exception as e:
+                print("Error loading dedup index:", e)
+        return {}
+
+    def save(self):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with self.lock, open(tmp_path, "w", encoding="utf-8") as f:
+            dump(self.entries, f, indent=4)
+        tmp_path.replace(self.index_path)
+
+    def refresh(self):
+        current = {}
+        for path in self.exports.glob("*.osz"):
+            st = path.stat()
+            old = self.entries.get(path.name)
+            # A digest is only reused if the file is unchanged
+            digest = old["digest"] if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime else None
+            current[path.name] = {
+                "set_id": archive_set_id(path.name),
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+                "inode": st.st_ino,
+                "digest": digest,
+            }
+        self.entries = current
+
+    def digest(self, name):
+        with self.lock:
+            entry = self.entries[name]
+            if not entry["digest"]:
+                entry["digest"] = hash_file(self.exports / name)
+            return entry["digest"]
+
+    def candidates(self, set_id, size):
+        with self.lock:
+            return [
+                name for name, e in self.entries.items()
+                if e["set_id"] == str(set_id) and e["size"] == size
+            ]
+
+    def find_same_size(self, set_id, size):
+        # Cheap pre-download check: same beatmapset and same Content-Length
+        names = self.candidates(set_id, size)
+        return self.exports / names[0] if names else None
+
+    def find_duplicate(self, path):
+        # Returns an indexed archive with the same content as path, hashing only same-size candidates
+        path = Path(path)
+        size = path.stat().st_size
+        names = [n for n in self.candidates(archive_set_id(path.name), size) if n != path.name]
+        if not names:
+            return None
+
+        new_digest = hash_file(path)
+        for name in names:
+            if self.digest(name) == new_digest:
+                return self.exports / name
+        return None
+
+    def add(self, path):
+        path = Path(path)
+        st = path.stat()
+        with self.lock:
+            self.entries[path.name] = {
+                "set_id": archive_set_id(path.name),
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+                "inode": st.st_ino,
+                "digest": None,
+            }
+
+    def groups(self):
+        # Groups archives by beatmapset id, then size, then content digest
+        by_size = {}
+        for name, e in self.entries.items():
+            if e["set_id"]:
+                by_size.setdefault((e["set_id"], e["size"]), []).append(name)
+
+        for names in by_size.values():
+            if len(names) < 2:
+                continue
+            by_digest = {}
+            for name in names:
+                by_digest.setdefault(self.digest(name), []).append(name)
+            for same in by_digest.values():
+                if len(same) > 1:
+                    yield same
+
+
+def pick_canonical(names, entries):
+    # Server-provided names win over "<id>.osz" fallbacks, then the oldest file
+    return min(names, key=lambda n: (n == f"{entries[n]['set_id']}.osz", entries[n]["mtime"], n))
+
+
+def replace_with_link(canonical, duplicate):
+    tmp_path = duplicate.with_suffix(duplicate.suffix + ".linking")
+    os.link(canonical, tmp_path)
+    os.replace(tmp_path, duplicate)
@@ -1,7 +1,12 @@
-from time import sleep
+import os
+from errno import ENOSPC
+from time import sleep, monotonic
 from re import search
+from threading import Event, Thread, local
+from shutil import copyfileobj, disk_usage
 from requests.utils import unquote_header_value
-from zipfile import is_zipfile
+from zipfile import BadZipFile, ZipFile, is_zipfile
+from Utils.watchdog import MIN_READ_SIZE, STALL_FLOOR, DownloadCancelled, StallError, TransferWatchdog, max_read_size
 
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -9,6 +14,77 @@ DEFAULT_HEADERS = {
     "Referer": "https://osu.ppy.sh/"
 }
 
+# Largest read from the socket; one buffer per worker thread, reused for every download.
+# With a stall floor the buffer is only as large as one read may be (see max_read_size).
+BUFFER_SIZE = 1024 * 1024
+
+# Archives of at least SEGMENT_THRESHOLD bytes are fetched as SEGMENTS byte ranges on parallel connections
+SEGMENTS = 4
+SEGMENT_THRESHOLD = 32 * 1024 * 1024
+SEGMENT_RETRIES = 3
+SEGMENT_BUFFER_SIZE = 256 * 1024
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".flv", ".m4v", ".mkv", ".webm", ".wmv", ".mov", ".mpg", ".mpeg")
+
+
+class SessionError(RuntimeError):
+    # The response depends on the account: the login expired or the account is throttled
+    def __init__(self, message, expired=False, retry_after=None):
+        super().__init__(message)
+        self.expired = expired
+        self.retry_after = retry_after
+
+
+class DiskFullError(OSError):
+    pass
+
+
+class RangeNotSupported(RuntimeError):
+    # The source answered a range request with the whole archive
+    pass
+
+
+_buffers = local()
+
+
+def _read_buffer(size):
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) != size:
+        buffer = _buffers.buffer = memoryview(bytearray(size))
+    return buffer
+
+
+def _body_reader(res):
+    # Without a Content-Encoding the body is the archive itself: http.client reads it straight into our buffer.
+    # urllib3's readinto reads into a new bytes object and copies that over, so it is only used to decode.
+    fp = getattr(res.raw, "_fp", None)
+    if res.headers.get("Content-Encoding", "identity").lower() == "identity" and hasattr(fp, "readinto"):
+        return fp.readinto
+    res.raw.decode_content = True
+    return res.raw.readinto
+
+
+def _release_body(res):
+    # Reading past urllib3 skips its bookkeeping: a fully read body still hands its connection back to the pool
+    fp = getattr(res.raw, "_fp", None)
+    if fp is not None and fp.isclosed():
+        res.raw.release_conn()
+
+
+def preallocate(f, length):
+    # Reserves the whole archive before writing: a full disk fails here instead of midway,
+    # and parallel downloads don't interleave their blocks on disk
+    if disk_usage(os.path.dirname(os.path.abspath(f.name))).free < length:
+        raise DiskFullError(ENOSPC, f"Not enough disk space for {length / 1024 / 1024:.1f} MB", f.name)
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, length)
+        except OSError as e:
+            if e.errno == ENOSPC:
+                raise DiskFullError(ENOSPC, "Not enough disk space", f.name) from e
+            # Filesystems without fallocate support just grow the file while writing
+
+
 def extract_id(link):
     link = link.strip()
     if not link:
@@ -28,7 +104,197 @@ def get_filename(header):
     return None
 
 
-def download_songs(session, url, out_path):
+def check_session(res, url):
+    # Raises SessionError for the responses that depend on the account rather than the beatmap
+    if res.status_code == 429:
+        raise SessionError(f"HTTP 429 while requesting {url}", retry_after=res.headers.get("Retry-After"))
+    if res.status_code in (401, 403) or res.headers.get("Content-Type", "").startswith("text/html"):
+        raise SessionError(f"Session rejected (HTTP {res.status_code}) while requesting {url}", expired=True)
+
+
+def _stream_to_file(res, tmp_path, length, handle, buffer_size, stall_floor, cancel):
+    buffer = _read_buffer(min(buffer_size, max_read_size(stall_floor) or buffer_size))
+    readinto = _body_reader(res)
+    downloaded = 0
+
+    with TransferWatchdog(res, stall_floor, cancel=cancel) as watchdog:
+        try:
+            with open(tmp_path, "wb", buffering=0) as f:
+                if length:
+                    preallocate(f, length)
+                # Reads go into the reused buffer and are written out from it.
+                # They grow up to the whole buffer on fast links and shrink on slow ones,
+                # so the watchdog keeps seeing progress.
+                largest = len(buffer)
+                size = min(MIN_READ_SIZE, largest)
+                while True:
+                    started = monotonic()
+                    n = readinto(buffer[:size])
+                    if not n:
+                        break
+                    _write_at(f.fileno(), buffer[:n], downloaded)
+                    downloaded += n
+                    watchdog.done = downloaded
+                    if handle:
+                        handle.add(n)
+                    took = monotonic() - started
+                    if took < 0.25:
+                        size = min(size * 2, largest)
+                    elif took > 1.0:
+                        size = max(size // 2, min(MIN_READ_SIZE, largest))
+        except Exception:
+            watchdog.check()
+            raise
+    _release_body(res)
+
+    # An aborted connection can also look like a clean end of stream
+    if not (length and downloaded == length):
+        watchdog.check()
+    if length and downloaded != length:
+        raise RuntimeError(f"Incomplete download ({downloaded}/{length} bytes)")
+    return downloaded
+
+
+class _Segment:
+    # Byte range [start, end] of the archive; done is only written by the thread fetching it
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.done = 0
+        self.error = None
+
+    @property
+    def remaining(self):
+        return self.end + 1 - self.start - self.done
+
+
+def _write_at(fd, data, offset):
+    # Positional writes, so the segments can share one file without a lock
+    if hasattr(os, "pwrite"):
+        while data:
+            n = os.pwrite(fd, data, offset)
+            data = data[n:]
+            offset += n
+    else:
+        # Windows: every segment has its own descriptor, so seek + write can't interleave
+        os.lseek(fd, offset, os.SEEK_SET)
+        while data:
+            data = data[os.write(fd, data):]
+
+
+def _fetch_segment(session, url, tmp_path, segment, validator, stall_floor, abort):
+    buffer = memoryview(bytearray(min(SEGMENT_BUFFER_SIZE, max_read_size(stall_floor) or SEGMENT_BUFFER_SIZE)))
+    failures = 0
+    wait = 1.0
+    fd = os.open(tmp_path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    try:
+        while segment.remaining and not abort.is_set():
+            offset = segment.start + segment.done
+            headers = dict(DEFAULT_HEADERS, Range=f"bytes={offset}-{segment.end}")
+            if validator:
+                # A changed archive comes back whole (200) instead of mixing two versions
+                headers["If-Range"] = validator
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=30) as res:
+                    check_session(res, url)
+                    if res.status_code == 200:
+                        raise RangeNotSupported(f"HTTP 200 for a range of {url}")
+                    content_range = res.headers.get("Content-Range", "")
+                    if res.status_code != 206 or not content_range.startswith(f"bytes {offset}-{segment.end}/"):
+                        raise RuntimeError(f"HTTP {res.status_code} ({content_range or 'no Content-Range'}) "
+                                           f"for bytes {offset}-{segment.end}")
+                    if res.headers.get("Content-Encoding"):
+                        raise RangeNotSupported(f"encoded range of {url}")
+
+                    readinto = _body_reader(res)
+                    received = 0
+                    with TransferWatchdog(res, stall_floor, cancel=abort) as watchdog:
+                        try:
+                            while segment.remaining:
+                                n = readinto(buffer[:min(len(buffer), segment.remaining)])
+                                if not n:
+                                    break
+                                _write_at(fd, buffer[:n], offset)
+                                offset += n
+                                received += n
+                                segment.done += n
+                                watchdog.done = received
+                        except Exception:
+                            watchdog.check()
+                            raise
+                    if segment.remaining:
+                        watchdog.check()
+                        raise RuntimeError(f"connection closed with {segment.remaining} bytes left")
+                    _release_body(res)
+            except (SessionError, RangeNotSupported, DownloadCancelled) as e:
+                segment.error = e
+                break
+            except Exception as e:
+                failures += 1
+                if failures >= SEGMENT_RETRIES:
+                    segment.error = RuntimeError(f"bytes {segment.start}-{segment.end}: {e}")
+                    break
+                if not isinstance(e, StallError):
+                    # A stalled range reconnects right away; the bytes already written are kept either way
+                    sleep(wait)
+                    wait *= 1.5
+    finally:
+        os.close(fd)
+        if segment.error:
+            abort.set()  # the archive can't be completed, stop the other segments too
+
+
+def download_segmented(session, url, tmp_path, length, segments=SEGMENTS, handle=None, validator=None,
+                       stall_floor=STALL_FLOOR, cancel=None):
+    # Fetches [0, length) as byte ranges on parallel connections into one preallocated file.
+    # A failed segment is retried on its own from where it stopped; the archive is verified before returning.
+    with open(tmp_path, "wb") as f:
+        preallocate(f, length)
+        f.truncate(length)
+
+    step = -(-length // segments)
+    parts = [_Segment(start, min(start + step, length) - 1) for start in range(0, length, step)]
+    abort = Event()
+    threads = [Thread(target=_fetch_segment, args=(session, url, tmp_path, part, validator, stall_floor, abort),
+                      daemon=True) for part in parts]
+    for thread in threads:
+        thread.start()
+
+    # The segments only count their own bytes; this thread is the one writer of the progress handle
+    reported = 0
+    while any(thread.is_alive() for thread in threads):
+        sleep(0.1)
+        if cancel and cancel.is_set():
+            abort.set()
+        done = sum(part.done for part in parts)
+        if handle:
+            handle.add(done - reported)
+        reported = done
+
+    if cancel and cancel.is_set():
+        raise DownloadCancelled("another request finished first")
+    errors = [part.error for part in parts if part.error]
+    if errors:
+        # The first real failure, not the cancellations it caused in the other segments
+        raise next((e for e in errors if not isinstance(e, DownloadCancelled)), errors[0])
+
+    # Every range written in full, and the archive readable end to end before it's renamed into place
+    if sum(part.done for part in parts) != length or os.path.getsize(tmp_path) != length:
+        raise RuntimeError(f"Incomplete segmented download ({sum(part.done for part in parts)}/{length} bytes)")
+    try:
+        with ZipFile(tmp_path) as zf:
+            bad = zf.testzip()
+    except BadZipFile as e:
+        raise RuntimeError(f"Segmented download is not a valid archive: {e}")
+    if bad:
+        raise RuntimeError(f"Segmented download failed its CRC check at {bad}")
+
+
+def download_songs(session, url, out_path, progress=None, buffer_size=BUFFER_SIZE, race=None, report=None,
+                   stall_floor=STALL_FLOOR, segments=SEGMENTS, segment_threshold=SEGMENT_THRESHOLD):
+    # race: the Attempt of a hedged download, which has its own temporary file and may be cancelled
+    # segments: connections used for archives of at least segment_threshold bytes, 1 always downloads one stream
     attempt = 0
     wait = 1.0
     final_path = None
@@ -39,29 +305,67 @@ def download_songs(session, url, out_path):
 
         try:
             with session.get(url, headers=DEFAULT_HEADERS, stream=True, allow_redirects=True, timeout=30) as res:
+                check_session(res, url)
                 if res.status_code != 200:
                     raise RuntimeError(f"HTTP {res.status_code} while requesting {url}")
 
                 cd = res.headers.get("content-disposition") or res.headers.get("Content-Disposition")
-                filename = get_filename(cd)
+                filename = get_filename(cd) if cd else None
 
                 if filename:
                     out_path = out_path.with_name(filename)
 
-                tmp_path = out_path.with_suffix(out_path.suffix + ".downloading")
-                downloaded = 0
+                tmp_path = out_path.with_suffix(out_path.suffix + (race.suffix if race else ".downloading"))
+                # Content-Length is the encoded size when the server compresses, so it can't size the file then
+                length = 0 if res.headers.get("Content-Encoding") else int(res.headers.get("Content-Length", 0))
+                handle = progress.start(out_path.name, length) if progress else None
+                if handle and race:
+                    race.track(handle)
+
+                # Large archives from a source that serves byte ranges are fetched over several connections
+                ranged = (segments > 1 and length >= segment_threshold
+                          and res.headers.get("Accept-Ranges", "").lower() == "bytes")
+                complete = False
 
-                with open(tmp_path, "wb") as f:
-                    for chunk in res.iter_content(8192):  # 8192 <- CHUNK_SIZE
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
+                try:
+                    if ranged:
+                        validator = res.headers.get("ETag") or res.headers.get("Last-Modified")
+                        res.close()  # each segment opens its own request
+                        download_segmented(session, res.url, tmp_path, length, segments, handle, validator,
+                                           stall_floor, race.cancel if race else None)
+                        received = length
+                        if report:
+                            report.add("segmented_downloads")
+                    else:
+                        received = _stream_to_file(res, tmp_path, length, handle, buffer_size, stall_floor,
+                                                   race.cancel if race else None)
+                    if race and not race.claim():
+                        raise DownloadCancelled("another request finished first")
+                    complete = True
+                    if report:
+                        report.add("data_downloaded_bytes", received)
+                finally:
+                    if handle:
+                        progress.finish(handle, ok=complete)
+                    if not complete:
+                        tmp_path.unlink(missing_ok=True)
 
                 tmp_path.replace(out_path)
                 final_path = out_path
                 break
+        except (SessionError, DiskFullError, DownloadCancelled):
+            # Retrying with the same account (or the same disk) is pointless
+            raise
+        except RangeNotSupported as e:
+            print(f"  - {e}, downloading as a single stream")
+            segments = 1
+        except StallError as e:
+            # A fresh connection usually gets a faster route, no need to back off
+            print(f"  - Attempt {attempt}/{max_retries} stalled ({e}), reconnecting")
+            if report:
+                report.add("stalled_downloads")
         except Exception as e:
-            print(f"\n  - Attempt {attempt}/{max_retries} failed: {e}")
+            print(f"  - Attempt {attempt}/{max_retries} failed: {e}")
             if attempt < max_retries:
                 sleep(wait)
                 wait *= 1.5  # <- BACKOFF_FACTOR
@@ -72,8 +376,32 @@ def download_songs(session, url, out_path):
     return final_path
 
 
-def try_sources(session, beatmap_id, output_folder):
+def strip_videos(archive_path):
+    # Rewrites the archive without its video members, streaming every other member across
+    with ZipFile(archive_path) as zin:
+        members = zin.infolist()
+        kept = [info for info in members if not info.filename.lower().endswith(VIDEO_EXTENSIONS)]
+        if len(kept) == len(members):
+            return 0
+
+        tmp_path = archive_path.with_suffix(archive_path.suffix + ".stripping")
+        with ZipFile(tmp_path, "w") as zout:
+            for info in kept:
+                with zin.open(info) as src, zout.open(info, "w") as dst:
+                    copyfileobj(src, dst, 1024 * 1024)
+
+    size_before = archive_path.stat().st_size
+    tmp_path.replace(archive_path)
+    return size_before - archive_path.stat().st_size
+
+
+def try_sources(session, beatmap_id, output_folder, dedup_index=None, no_video=False, report=None, progress=None,
+                race=None, stall_floor=STALL_FLOOR, segments=SEGMENTS, segment_threshold=SEGMENT_THRESHOLD,
+                skip_same_size=False):
+    # skip_same_size: trust a same-size archive of the beatmapset in Exports without downloading it.
+    # A heuristic: an updated mapset of exactly the same size is never fetched again.
     url = f"https://osu.ppy.sh/beatmapsets/{beatmap_id}/download"
+    full_size = 0
 
     try:
         try:
@@ -83,18 +411,53 @@ def try_sources(session, beatmap_id, output_folder):
             head = None
 
         if head and head.status_code == 200:
-            name = get_filename(head.headers.get("content-disposition") or head.headers.get("Content-Disposition"))
+            cd = head.headers.get("content-disposition") or head.headers.get("Content-Disposition")
+            name = (get_filename(cd) if cd else None) or f"{beatmap_id}.osz"
+
+            # Opt-in size heuristic: same beatmapset with the same size already in Exports, skip before writing anything.
+            # Otherwise duplicates are only dropped after the download, by content hash.
+            full_size = int(head.headers.get("Content-Length", 0))
+            if (skip_same_size and dedup_index and full_size and not no_video
+                    and (existing := dedup_index.find_same_size(beatmap_id, full_size))):
+                print(f"✔ {existing.name} already downloaded, skipping")
+                if report:
+                    report.add("skipped_duplicates")
+                return existing
         else:
             name = f"{beatmap_id}.osz"
 
         out_path = output_folder / name
-        final_path = download_songs(session, url, out_path)
+        final_path = download_songs(session, f"{url}?noVideo=1" if no_video else url, out_path, progress,
+                                    race=race, report=report, stall_floor=stall_floor, segments=segments,
+                                    segment_threshold=segment_threshold)
 
         if is_zipfile(final_path):
+            if no_video:
+                received = final_path.stat().st_size
+                stripped = strip_videos(final_path)
+                if report and stripped:
+                    # The source ignored noVideo: the video was downloaded, it only stops taking disk space
+                    report.add("video_stripped_bytes", stripped)
+                elif report and full_size > received:
+                    report.add("video_skipped_bytes", full_size - received)
+
+            if dedup_index:
+                if duplicate := dedup_index.find_duplicate(final_path):
+                    final_path.unlink(missing_ok=True)
+                    print(f"✔ {final_path.name} is identical to {duplicate.name}, kept the existing file")
+                    if report:
+                        report.add("skipped_duplicates")
+                    return duplicate
+                dedup_index.add(final_path)
+
             print(f"✔ {final_path.name} downloaded successfully")
+            if report:
+                report.add("downloaded")
             return final_path
         else:
             final_path.unlink(missing_ok=True)
             raise RuntimeError("Invalid ZIP file")
+    except (SessionError, DownloadCancelled):
+        raise
     except Exception as e:
         raise RuntimeError(f"Could not download a valid .osz for {beatmap_id}: {e}")
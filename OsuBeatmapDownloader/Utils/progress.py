@@ -0,0 +1,191 @@
+import sys
+from time import monotonic
+from threading import Event, Lock, Thread
+
+PUBLISH_RATE = 10.0
+SPEED_SMOOTHING = 0.3
+
+
+class DownloadProgress:
+    # Byte counter owned by one worker thread; only that thread writes to it
+
+    __slots__ = ("name", "total", "done")
+
+    def __init__(self, name, total):
+        self.name = name
+        self.total = total
+        self.done = 0
+
+    def add(self, amount):
+        self.done += amount
+
+
+class ProgressSnapshot:
+    __slots__ = ("active", "finished", "expected", "bytes_done", "bytes_per_second", "eta")
+
+    def __init__(self, active, finished, expected, bytes_done, bytes_per_second, eta):
+        self.active = active
+        self.finished = finished
+        self.expected = expected
+        self.bytes_done = bytes_done
+        self.bytes_per_second = bytes_per_second
+        self.eta = eta
+
+    def status_line(self):
+        eta = f"{self.eta:.0f}s" if self.eta is not None else "--"
+        done = f"{self.finished}/{self.expected}" if self.expected else str(self.finished)
+        return (f"{done} maps | {len(self.active)} active | {self.bytes_done / 1024 / 1024:.1f} MB "
+                f"| {self.bytes_per_second / 1024 / 1024:.2f} MB/s | ETA {eta}")
+
+
+class ProgressAggregator:
+    # Collects per-download counters from workers and publishes one snapshot of all of them at a fixed rate
+
+    def __init__(self, expected=0, rate=PUBLISH_RATE):
+        self.expected = expected
+        self.interval = 1.0 / rate
+        self.lock = Lock()
+        self.active = []
+        self.finished = 0        # links done, whatever the outcome (downloaded, skipped, failed)
+        self.transfers = 0       # successful transfers, for the average archive size
+        self.finished_bytes = 0
+        self.subscribers = []
+        self.stop_event = Event()
+        self.thread = None
+        self._last_time = monotonic()
+        self._last_bytes = 0
+        self._speed = 0.0
+
+    def start(self, name, total=0):
+        progress = DownloadProgress(name, total)
+        with self.lock:
+            self.active.append(progress)
+        return progress
+
+    def finish(self, progress, ok=True):
+        with self.lock:
+            self.active.remove(progress)
+            self.finished_bytes += progress.done
+            if ok:
+                self.transfers += 1
+
+    def link_done(self):
+        # One link settled: a link can make several transfers (retries, hedges) or none (skipped, failed)
+        with self.lock:
+            self.finished += 1
+
+    def snapshot(self):
+        with self.lock:
+            active = [(p.name, p.done, p.total) for p in self.active]
+            finished = self.finished
+            transfers = self.transfers
+            finished_bytes = self.finished_bytes
+
+            bytes_done = finished_bytes + sum(done for _, done, _ in active)
+            now = monotonic()
+            elapsed = now - self._last_time
+            if elapsed > 0:
+                instant = (bytes_done - self._last_bytes) / elapsed
+                self._speed += SPEED_SMOOTHING * (instant - self._speed)
+                self._last_time = now
+                self._last_bytes = bytes_done
+
+        # Remaining maps are estimated at the average size of the downloaded ones
+        eta = None
+        if self._speed > 0:
+            remaining = sum(max(0, total - done) for _, done, total in active if total)
+            if self.expected and transfers:
+                remaining += max(0, self.expected - finished - len(active)) * finished_bytes / transfers
+            eta = remaining / self._speed
+
+        return ProgressSnapshot(active, finished, self.expected, bytes_done, self._speed, eta)
+
+    # ---------- publishing ----------
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def _publish(self):
+        while not self.stop_event.wait(self.interval):
+            snapshot = self.snapshot()
+            for callback in self.subscribers:
+                callback(snapshot)
+
+    def __enter__(self):
+        self.thread = Thread(target=self._publish, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        snapshot = self.snapshot()
+        for callback in self.subscribers:
+            callback(snapshot)
+        return False
+
+
+class TerminalBar:
+    # Redraws a single status line in place. Used as sys.stdout while downloading (contextlib.redirect_stdout),
+    # it prints the workers' messages above the status line instead of into it.
+
+    def __init__(self, width=30, stream=sys.stdout):
+        self.width = width
+        self.stream = stream
+        self.lock = Lock()
+        self.line = ""
+        self.pending = ""
+
+    def __call__(self, snapshot):
+        if snapshot.expected:
+            filled = int(self.width * min(snapshot.finished, snapshot.expected) / snapshot.expected)
+            bar = "#" * filled + "-" * (self.width - filled)
+            line = f"[{bar}] {snapshot.status_line()}"
+        else:
+            line = snapshot.status_line()
+        with self.lock:
+            # Padded so a shorter line fully covers the previous one
+            self.stream.write("\r" + line.ljust(len(self.line)))
+            self.line = line
+            self.stream.flush()
+
+    def write(self, text):
+        with self.lock:
+            self.pending += text
+            if "\n" not in self.pending:
+                return len(text)
+            complete, self.pending = self.pending.rsplit("\n", 1)
+            # Clear the status line, print the finished lines, redraw the status line below them
+            self.stream.write("\r" + " " * len(self.line) + "\r" + complete + "\n" + self.line)
+            self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+
+class TkProgressView:
+    # Renders snapshots in Tk widgets; polls from the Tk thread with root.after so workers never touch Tk
+
+    def __init__(self, root, aggregator, label, progressbar, rate=PUBLISH_RATE):
+        self.root = root
+        self.aggregator = aggregator
+        self.label = label
+        self.progressbar = progressbar
+        self.delay = int(1000 / rate)
+        self.running = True
+        self.root.after(self.delay, self._poll)
+
+    def _poll(self):
+        if not self.running:
+            return
+        snapshot = self.aggregator.snapshot()
+        names = ", ".join(name for name, _, _ in snapshot.active[:3])
+        self.label.config(text=f"Downloading: {names}\n{snapshot.status_line()}" if names else snapshot.status_line())
+        if snapshot.expected:
+            self.progressbar['value'] = snapshot.finished / snapshot.expected * 100
+        self.root.after(self.delay, self._poll)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,31 @@
+from threading import Lock
+
+
+class RunReport:
+    # Thread-safe counters printed at the end of a download run
+
+    def __init__(self):
+        self.counters = {}
+        self.notes = []
+        self.lock = Lock()
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def note(self, text):
+        with self.lock:
+            self.notes.append(text)
+
+    def get(self, name):
+        return self.counters.get(name, 0)
+
+    def print_summary(self):
+        print("\n=== Run Report ===")
+        for name, value in self.counters.items():
+            if name.endswith("_bytes"):
+                print(f"{name[:-6].replace('_', ' ').capitalize()}: {value / 1024 / 1024:.1f} MB")
+            else:
+                print(f"{name.replace('_', ' ').capitalize()}: {value}")
+        for text in self.notes:
+            print(text)
\ No newline at end of file
@@ -0,0 +1,136 @@
+from json import load, dump
+from pathlib import Path
+from statistics import median
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from Utils.dedup_index import archive_set_id
+from Utils.osu_utils import DEFAULT_HEADERS, SessionError, check_session, extract_id
+from Utils.session_pool import NoSessionsLeft
+
+SIZES_FILE = ".osz_sizes.json"
+POLICIES = ("file", "smallest", "largest", "alternating")
+PROBE_WORKERS = 8
+
+
+class SizeCache:
+    # beatmapset id -> archive size in bytes, from earlier runs, the archives in Exports and HEAD probes
+
+    def __init__(self, exports):
+        self.exports = Path(exports)
+        self.path = self.exports / SIZES_FILE
+        self.lock = Lock()
+        self.sizes = self._load()
+        self.origins = dict.fromkeys(self.sizes, "earlier runs")
+
+        for archive in self.exports.glob("*.osz"):
+            set_id = archive_set_id(archive.name)
+            if set_id and set_id not in self.sizes:
+                self.sizes[set_id] = archive.stat().st_size
+                self.origins[set_id] = "Exports"
+
+    def _load(self):
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return load(f)
+            except Exception as e:
+                print("Error loading archive sizes:", e)
+        return {}
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with self.lock, open(tmp_path, "w", encoding="utf-8") as f:
+            dump(self.sizes, f)
+        tmp_path.replace(self.path)
+
+    def get(self, set_id):
+        return self.sizes.get(str(set_id))
+
+    def record(self, set_id, size, origin="earlier runs"):
+        if size:
+            with self.lock:
+                self.sizes[str(set_id)] = size
+                self.origins.setdefault(str(set_id), origin)
+
+
+def _set_id(link):
+    try:
+        return str(extract_id(link))
+    except ValueError:
+        return None
+
+
+def probe_sizes(pool, links, sizes, workers=PROBE_WORKERS):
+    # HEAD requests for the links whose size is still unknown; Content-Length is all that is read
+    unknown = [set_id for set_id in map(_set_id, links) if set_id and sizes.get(set_id) is None]
+
+    def probe(set_id):
+        try:
+            pooled = pool.acquire()
+        except NoSessionsLeft:
+            return
+        ok = False
+        try:
+            url = f"https://osu.ppy.sh/beatmapsets/{set_id}/download"
+            res = pooled.session.head(url, headers=DEFAULT_HEADERS, allow_redirects=True, timeout=15)
+            check_session(res, url)
+            ok = res.status_code == 200
+            if ok:
+                sizes.record(set_id, int(res.headers.get("Content-Length", 0)), "HEAD")
+        except SessionError as e:
+            # Same handling as a download: the account cools down (or is dropped) and the size stays unknown
+            if e.expired:
+                pool.expire(pooled)
+            else:
+                pool.throttle(pooled, e.retry_after)
+        except Exception as e:
+            print(f"HEAD request error: {e}")
+        finally:
+            pool.release(pooled, ok)
+
+    if unknown:
+        print(f"Probing the size of {len(unknown)} mapsets...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(probe, unknown))
+
+
+def schedule(links, sizes, policy="file"):
+    # Returns (ordered links, summary line for the run report)
+    # smallest: most maps finished early, and an interrupted run keeps the most maps
+    # largest: big archives start first so every worker stays busy until the end (bandwidth saturation)
+    # alternating: smallest and largest left in turn, so concurrent downloads mix both
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown schedule {policy!r}, expected one of {', '.join(POLICIES)}")
+
+    ids = [_set_id(link) for link in links]
+    known = [sizes.get(set_id) for set_id in ids if set_id and sizes.get(set_id)]
+    estimate = median(known) if known else 0
+    estimated = [(sizes.get(set_id) if set_id else None) or estimate for set_id in ids]
+
+    order = list(range(len(links)))
+    if policy in ("smallest", "alternating"):
+        order.sort(key=lambda i: estimated[i])
+    elif policy == "largest":
+        order.sort(key=lambda i: estimated[i], reverse=True)
+
+    if policy == "alternating":
+        mixed = []
+        low, high = 0, len(order) - 1
+        while low <= high:
+            mixed.append(order[low])
+            if low != high:
+                mixed.append(order[high])
+            low += 1
+            high -= 1
+        order = mixed
+
+    origins = {}
+    for set_id in ids:
+        if set_id and sizes.get(set_id):
+            origin = sizes.origins.get(set_id, "earlier runs")
+            origins[origin] = origins.get(origin, 0) + 1
+    from_where = ", ".join(f"{count} from {origin}" for origin, count in origins.items())
+
+    summary = (f"Schedule: {policy}, sizes known for {len(known)}/{len(links)} links"
+               f"{f' ({from_where})' if from_where else ''}, estimated {sum(estimated) / 1024 / 1024:.1f} MB in total")
+    return [links[i] for i in order], summary
@@ -0,0 +1,97 @@
+from time import monotonic
+from threading import Condition
+from requests import Session
+
+MAX_IN_FLIGHT = 2
+BASE_COOLDOWN = 60.0
+MAX_COOLDOWN = 900.0
+
+
+class NoSessionsLeft(RuntimeError):
+    pass
+
+
+class PooledSession:
+    # One logged-in account and its observed health
+
+    def __init__(self, name, cookie):
+        self.name = name
+        self.session = Session()
+        self.session.cookies.set("osu_session", cookie)
+        self.alive = True
+        self.in_flight = 0
+        self.throttled_until = 0.0
+        self.throttle_count = 0
+        self.completed = 0
+        self.failures = 0
+
+    def available(self, now):
+        return self.alive and self.in_flight < MAX_IN_FLIGHT and self.throttled_until <= now
+
+    def status(self):
+        if not self.alive:
+            return "expired"
+        if self.throttled_until > monotonic():
+            return f"throttled ({self.throttled_until - monotonic():.0f}s left)"
+        return "ok"
+
+
+class SessionPool:
+    # Hands out the least throttled, least busy account; expired accounts leave the pool
+
+    def __init__(self, cookies):
+        self.sessions = [PooledSession(name, cookie) for name, cookie in cookies.items() if cookie]
+        self.condition = Condition()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                alive = [s for s in self.sessions if s.alive]
+                if not alive:
+                    raise NoSessionsLeft("Every session in the pool has expired")
+
+                now = monotonic()
+                ready = [s for s in alive if s.available(now)]
+                if ready:
+                    chosen = min(ready, key=lambda s: (s.throttle_count, s.in_flight, s.failures))
+                    chosen.in_flight += 1
+                    return chosen
+
+                # Wait for a download to finish or for the earliest cooldown to run out
+                cooldowns = [s.throttled_until - now for s in alive if s.throttled_until > now]
+                self.condition.wait(timeout=min(cooldowns) if cooldowns else None)
+
+    def release(self, pooled, ok):
+        with self.condition:
+            pooled.in_flight -= 1
+            if ok:
+                pooled.completed += 1
+            else:
+                pooled.failures += 1
+            self.condition.notify_all()
+
+    def throttle(self, pooled, retry_after=None):
+        with self.condition:
+            pooled.throttle_count += 1
+            try:
+                cooldown = float(retry_after)
+            except (TypeError, ValueError):
+                cooldown = min(BASE_COOLDOWN * 2 ** (pooled.throttle_count - 1), MAX_COOLDOWN)
+            pooled.throttled_until = monotonic() + cooldown
+            print(f"⏸ Session {pooled.name} throttled, resting {cooldown:.0f}s")
+            self.condition.notify_all()
+
+    def expire(self, pooled):
+        with self.condition:
+            pooled.alive = False
+            print(f"✖ Session {pooled.name} expired, removed from the pool")
+            self.condition.notify_all()
+
+    def health(self):
+        return [
+            f"Session {s.name}: {s.status()}, {s.completed} done, {s.failures} failed, throttled {s.throttle_count}x"
+            for s in self.sessions
+        ]
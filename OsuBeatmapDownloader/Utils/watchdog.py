@@ -0,0 +1,151 @@
+import socket
+from math import inf
+from collections import deque
+from time import monotonic
+from threading import Condition, Event, Lock, Thread
+
+STALL_FLOOR = 16 * 1024   # bytes/s
+STALL_WINDOW = 15.0       # seconds the throughput is averaged over
+TICK = 1.0
+MIN_READ_SIZE = 16 * 1024  # slow transfers read in small steps so the byte count keeps moving
+
+
+def max_read_size(floor, window=STALL_WINDOW):
+    # The byte count only moves when a read returns, so one read at the floor rate must fit well inside the window
+    # (half of it); otherwise a slow but healthy transfer looks stalled. None when there is no floor.
+    if not floor:
+        return None
+    return max(1024, int(floor * window / 2))
+
+
+class StallError(RuntimeError):
+    pass
+
+
+class DownloadCancelled(RuntimeError):
+    # The other request of a hedged download finished first
+    pass
+
+
+class TransferWatchdog:
+    # Aborts the connection of a download that falls below floor bytes/s over the last window seconds,
+    # or whose cancel event is set. A blocked read can't be interrupted otherwise.
+
+    def __init__(self, response, floor=STALL_FLOOR, window=STALL_WINDOW, cancel=None):
+        self.response = response
+        self.floor = floor
+        self.window = window
+        self.cancel = cancel
+        self.done = 0
+        self.reason = None
+        self.samples = deque([(monotonic(), 0)])
+        self.stop = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        return False
+
+    def _run(self):
+        while not self.stop.wait(TICK):
+            if self.cancel and self.cancel.is_set():
+                return self._abort("cancelled")
+
+            now = monotonic()
+            self.samples.append((now, self.done))
+            while len(self.samples) > 1 and now - self.samples[1][0] >= self.window:
+                self.samples.popleft()
+
+            since, done_then = self.samples[0]
+            if self.floor and now - since >= self.window and (self.done - done_then) / (now - since) < self.floor:
+                return self._abort("stalled")
+
+    def _abort(self, reason):
+        self.reason = reason
+        try:
+            # Wakes up the worker blocked in recv
+            self.response.raw.connection.sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+        self.response.close()
+
+    def check(self):
+        # Turns the error of an aborted read into the reason it was aborted
+        if self.reason == "stalled":
+            raise StallError(f"below {self.floor / 1024:.0f} KB/s for {self.window:.0f}s")
+        if self.reason == "cancelled":
+            raise DownloadCancelled("another request finished first")
+
+
+class HedgedDownload:
+    # One link downloaded by up to two requests at once; the first to finish claims it and cancels the other
+
+    def __init__(self, link):
+        self.link = link
+        self.started = monotonic()
+        self.lock = Lock()
+        self.ended = Condition(self.lock)
+        self.cancels = {}
+        self.handles = []
+        self.running = 0
+        self.winner = None
+        self.hedged = False
+
+    def attempt(self, tag):
+        with self.lock:
+            self.running += 1
+            self.cancels[tag] = Event()
+            if self.winner is not None:
+                self.cancels[tag].set()
+        return Attempt(self, tag)
+
+    def claim(self, tag):
+        with self.lock:
+            if self.winner is None:
+                self.winner = tag
+                for other, cancel in self.cancels.items():
+                    if other != tag:
+                        cancel.set()
+            return self.winner == tag
+
+    def end(self):
+        with self.lock:
+            self.running -= 1
+            self.ended.notify_all()
+
+    def wait_all(self):
+        # Blocks until every attempt has ended; True when one of them claimed the download
+        with self.lock:
+            while self.running:
+                self.ended.wait()
+            return self.winner is not None
+
+    def eta(self):
+        # Seconds left for the furthest request, inf while nothing is known yet
+        elapsed = monotonic() - self.started
+        best = max(self.handles, key=lambda h: h.done, default=None)
+        if not best or not best.total or not best.done or elapsed <= 0:
+            return inf
+        return (best.total - best.done) / (best.done / elapsed)
+
+
+class Attempt:
+    # What download_songs needs from a hedged download: its own temporary file, cancel event and claim
+
+    def __init__(self, download, tag):
+        self.download = download
+        self.tag = tag
+        self.cancel = download.cancels[tag]
+        self.suffix = f".{tag}.downloading"
+
+    def claim(self):
+        return self.download.claim(self.tag)
+
+    def track(self, handle):
+        with self.download.lock:
+            self.download.handles.append(handle)
@@ -1,12 +1,42 @@
+import sys
 import threading
+from argparse import ArgumentParser
 from platform import system
+from Addons.config import REPO_ROOT, load_config, save_config
 from Addons.get_cookie import get_cookie
 from Addons.get_file import get_file
 from Addons.get_links_list import get_links_list
+from Scripts.audit_exports import audit_exports, requeue_failed
+from Scripts.dedup_exports import dedup_exports
 from Scripts.start_download import start_download
 from Scripts.start_threads import thread_get_folder, results
+from Utils.scheduler import POLICIES
+
+sys.path.insert(0, REPO_ROOT)
+from osu_library import profiling
 
 if __name__ == '__main__':
+    parser = ArgumentParser(description="osu! beatmap downloader")
+    parser.add_argument("--audit", action="store_true", help="check every .osz in Exports and re-download the broken ones")
+    parser.add_argument("--dedup", action="store_true", help="hardlink identical archives in Exports and skip identical downloads")
+    parser.add_argument("--dedup-remove", action="store_true", help="like --dedup but delete the identical copies")
+    parser.add_argument("--skip-same-size", action="store_true", help="with --dedup, skip mapsets whose archive in Exports has the same size (heuristic, no hash check)")
+    parser.add_argument("--no-video", action="store_true", help="download mapsets without their background video")
+    parser.add_argument("--schedule", choices=POLICIES, default="file", help="download order: file order (default), smallest or largest archives first, or alternating smallest and largest")
+    parser.add_argument("--probe-sizes", action="store_true", help="send a HEAD request for archives of unknown size before scheduling")
+    parser.add_argument("--skip-installed", action="store_true", help="skip mapsets already in Songs or Exports (uses the index service when it runs)")
+    parser.add_argument("--hedge", action="store_true", help="near the end of a batch, start a second request for the slowest downloads")
+    parser.add_argument("--stall-floor", type=float, default=16, metavar="KB/S", help="abort and retry downloads slower than this over 15s (0 disables)")
+    parser.add_argument("--segments", type=int, default=4, help="parallel range requests for large archives (1 disables)")
+    parser.add_argument("--segment-threshold", type=float, default=32, metavar="MB", help="archives at least this large are downloaded in segments")
+    parser.add_argument("--add-account", metavar="NAME", help="log in with another osu! account and add it to the session pool")
+    parser.add_argument("--profile", nargs="?", const="spans", metavar="MODE", help="print timing spans (spans, cprofile or sample)")
+    args = parser.parse_args()
+
+    if args.profile:
+        profiling.enable(args.profile)
+    else:
+        profiling.enable_from_env([])
 
     osu_path_thread = threading.Thread(target=thread_get_folder)
     osu_path_thread.start()
@@ -18,9 +48,51 @@ if __name__ == '__main__':
         "https://osu.ppy.sh/"
     )
 
+    # Extra accounts are listed in config.json under "osu_accounts", each cookie saved as osu_session_<name>
+    configuration = load_config("config.json")
+    accounts = configuration.get("osu_accounts", [])
+    if args.add_account and args.add_account not in accounts:
+        accounts.append(args.add_account)
+        configuration["osu_accounts"] = accounts
+        save_config(configuration, "config.json")
+
+    osu_cookies = {"main": osu_cookie}
+    for name in accounts:
+        osu_cookies[name] = get_cookie(
+            "config.json",
+            "a.js-current-user-avatar.js-user-login--menu",
+            "osu_session",
+            "https://osu.ppy.sh/",
+            f"osu_session_{name}"
+        )
+
     osu_path_thread.join()
-    start_download(
-        osu_cookie,
+
+    dedup = args.dedup or args.dedup_remove
+    if dedup:
+        dedup_exports(results["osu_path"], remove=args.dedup_remove)
+
+    if args.audit:
+        links = requeue_failed(results["osu_path"], audit_exports(results["osu_path"]))
+        if not links:
+            print("Nothing to re-download.")
+            raise SystemExit(0)
+    else:
+        links = get_links_list(get_file(), r"https://osu\.ppy\.sh/beatmapsets/\d+#(osu|mania|fruits|taiko)/\d+")
+
+    profiling.run(
+        start_download,
+        osu_cookies,
         results["osu_path"],
-        get_links_list(get_file(), r"https://osu\.ppy\.sh/beatmapsets/\d+#(osu|mania|fruits|taiko)/\d+")
+        links,
+        dedup,
+        args.no_video,
+        schedule_policy=args.schedule,
+        probe=args.probe_sizes,
+        skip_installed=args.skip_installed,
+        hedge=args.hedge,
+        stall_floor=args.stall_floor * 1024,
+        segments=args.segments,
+        segment_threshold=int(args.segment_threshold * 1024 * 1024),
+        skip_same_size=args.skip_same_size
     )
\ No newline at end of file
@@ -14,6 +14,7 @@ Features:
 
 import os
 import re
+import sys
 import time
 import json
 import requests
@@ -27,6 +28,9 @@ import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import threading
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Utils.progress import ProgressAggregator, TkProgressView
+
 CONFIG_FILE = "osu_downloader_config.json"
 CHUNK_SIZE = 8192
 MAX_RETRIES = 3
@@ -124,11 +128,9 @@ class DownloadDashboard:
         self.current_index = 0
         self.lock = threading.Lock()
 
-    def update_download(self, beatmap_name, percent):
-        with self.lock:
-            self.label.config(text=f"Downloading: {beatmap_name}")
-            self.progress['value'] = percent
-            self.root.update_idletasks()
+        # Workers only bump byte counters; the dashboard redraws from one snapshot 10 times per second
+        self.aggregator = ProgressAggregator(expected=total_count)
+        self.view = TkProgressView(self.root, self.aggregator, self.label, self.progress)
 
     def add_completed(self, beatmap_name):
         with self.lock:
@@ -137,11 +139,10 @@ class DownloadDashboard:
             self.status.insert(tk.END, f"{self.current_index}/{self.total_count} ✔ {beatmap_name}\n")
             self.status.see(tk.END)
             self.status.config(state=tk.DISABLED)
-            self.progress['value'] = 0
-            self.root.update_idletasks()
 
     def finish(self):
         with self.lock:
+            self.view.stop()
             self.label.config(text="All downloads completed!")
             self.progress['value'] = 100
             self.root.update_idletasks()
@@ -206,15 +207,21 @@ def download_with_progress(session, url, out_path, gui_window=None):
                 tmp_path = out_path.with_suffix(out_path.suffix + ".downloading")
                 total_size = int(resp.headers.get('Content-Length', 0))
                 downloaded = 0
+                handle = gui_window.aggregator.start(out_path.name, total_size) if gui_window else None
+                complete = False
 
-                with open(tmp_path, "wb") as f:
-                    for chunk in resp.iter_content(CHUNK_SIZE):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size and gui_window:
-                                percent = downloaded / total_size * 100
-                                gui_window.root.after(0, gui_window.update_download, out_path.name, percent)
+                try:
+                    with open(tmp_path, "wb") as f:
+                        for chunk in resp.iter_content(CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                                downloaded += len(chunk)
+                                if handle:
+                                    handle.add(len(chunk))
+                    complete = True
+                finally:
+                    if handle:
+                        gui_window.aggregator.finish(handle, ok=complete)
 
                 tmp_path.replace(out_path)
                 final_path = out_path
@@ -356,6 +363,7 @@ class MainApp:
                     try_sources(session, beatmap_id, self.download_folder, dashboard)
                 except Exception as e:
                     print(f"✖ Error: {e}")
+                dashboard.aggregator.link_done()
             dashboard.root.after(0, dashboard.finish)
 
         threading.Thread(target=download_all, daemon=True).start()
@@ -0,0 +1,157 @@
+# Times library scans, hashing and collection exports on synthetic osu! folders
+# Every run is appended to a JSON-lines history keyed by git commit, and compared to the previous run.
+#
+#   python benchmarks/bench_library.py --sizes 1000,10000,100000
+
+import os
+import sys
+import json
+import hashlib
+import shutil
+import tempfile
+import argparse
+import subprocess
+from time import perf_counter, time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "collection_export"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "export_maps_by_tag"))
+
+from benchmarks.generate_library import generate_library
+from collection_export import load_collection_db, export_collections
+from export_maps_by_tag import SongScanner
+from osu_library.metadata_store import MetadataStore
+from osu_library.cache_files import CACHE_DIR_ENV
+
+HISTORY_FILE = "bench_history.jsonl"
+
+
+def evict_page_cache(folder):
+    # Drops the cached pages of every file so the next pass reads from disk (Linux only, no root needed)
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+
+def timed(func, *args, **kwargs):
+    start = perf_counter()
+    func(*args, **kwargs)
+    return perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_library(workdir, mapsets, difficulties, hit_objects):
+    # Libraries are reused between runs, generating 100k mapsets takes a while
+    osu_folder = os.path.join(workdir, f"osu_{mapsets}x{difficulties}x{hit_objects}")
+    marker = os.path.join(osu_folder, ".generated")
+    if not os.path.exists(marker):
+        print(f"Generating {mapsets} mapsets in {osu_folder}...")
+        generate_library(osu_folder, mapsets, difficulties, hit_objects, osu_db=True)
+        open(marker, "w").close()
+    return osu_folder
+
+
+def md5_file(path):
+    # Baseline: every .osu hashed from disk, the way the tools worked before the library index
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def hash_library(songs):
+    for root, _, files in os.walk(songs):
+        for name in files:
+            if name.endswith(".osu"):
+                md5_file(os.path.join(root, name))
+
+
+def run_benchmarks(osu_folder, collections_to_export):
+    songs = os.path.join(osu_folder, "Songs")
+    collection_db = os.path.join(osu_folder, "collection.db")
+    collections = load_collection_db(collection_db)
+    selected = list(range(min(collections_to_export, len(collections))))
+
+    results = {}
+
+    def both(name, func, *args):
+        # The first run starts from an empty cache folder, so the index caches of earlier runs can't make it warm;
+        # the second run reuses what the first one wrote
+        cache_dir = tempfile.mkdtemp(prefix="osu_bench_cache_")
+        os.environ[CACHE_DIR_ENV] = cache_dir
+        try:
+            cold = evict_page_cache(osu_folder)
+            results[f"{name}_{'cold' if cold else 'first'}"] = timed(func, *args)
+            results[f"{name}_warm"] = timed(func, *args)
+        finally:
+            del os.environ[CACHE_DIR_ENV]
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results["load_collection_db"] = timed(load_collection_db, collection_db)
+    both("hash_all", hash_library, songs)
+    both("tag_scan", lambda: SongScanner(songs, ["ln", "rice"]).scan())
+    both("metadata_store_build", MetadataStore.build, songs)
+    both("export_collections", export_collections, selected, collections, osu_folder)
+    return results
+
+
+def compare(history_path, size, results):
+    previous = None
+    if os.path.exists(history_path):
+        with open(history_path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["size"] == size:
+                    previous = entry
+
+    print(f"\n=== {size} mapsets ===")
+    for name, seconds in results.items():
+        line = f"{name:<30} {seconds:>9.3f}s"
+        if previous and name in previous["results"] and previous["results"][name]:
+            change = (seconds / previous["results"][name] - 1) * 100
+            line += f"   {change:+6.1f}% vs {previous['commit']}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark library scans on synthetic osu! folders")
+    parser.add_argument("--sizes", default="1000", help="comma-separated mapset counts, e.g. 1000,10000,100000")
+    parser.add_argument("--difficulties", type=int, default=4)
+    parser.add_argument("--hit-objects", type=int, default=1500)
+    parser.add_argument("--collections", type=int, default=3, help="collections exported per run")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "osu_bench"))
+    parser.add_argument("--history", default=HISTORY_FILE)
+    args = parser.parse_args()
+
+    commit = git_commit()
+    for size in (int(s) for s in args.sizes.split(",")):
+        osu_folder = prepare_library(args.workdir, size, args.difficulties, args.hit_objects)
+        results = run_benchmarks(osu_folder, args.collections)
+        compare(args.history, size, results)
+
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"commit": commit, "time": time(), "size": size, "results": results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# Builds a synthetic osu! folder for benchmarks: Songs/ with N mapsets of M difficulties,
+# realistic .osu headers followed by long [HitObjects] sections, a matching collection.db
+# and optionally an osu!.db.
+
+import os
+import struct
+import random
+import hashlib
+import argparse
+
+MODES = (0, 1, 2, 3)
+TAG_POOL = ("ln", "rice", "jumpstream", "chordjack", "stream", "tech", "vocaloid", "anime",
+            "electronic", "rock", "tournament", "farm", "marathon", "jack", "dt", "speed")
+
+OSU_DB_VERSION = 20240101
+
+
+# -------------------- .osu FILES --------------------
+
+def _hit_objects(rng, count, keys):
+    lines = []
+    time = rng.randint(500, 3000)
+    for _ in range(count):
+        column = rng.randrange(keys)
+        x = int((column + 0.5) * 512 / keys)
+        if rng.random() < 0.2:
+            end = time + rng.randint(100, 800)
+            lines.append(f"{x},192,{time},128,0,{end}:0:0:0:0:")
+        else:
+            lines.append(f"{x},192,{time},1,0,0:0:0:0:")
+        time += rng.choice((60, 90, 120, 180, 240))
+    return "\n".join(lines)
+
+
+def osu_file_text(rng, set_id, map_id, index, mode, hit_objects):
+    keys = rng.choice((4, 5, 6, 7, 8)) if mode == 3 else None
+    artist = f"Artist {set_id % 997}"
+    title = f"Song {set_id}"
+    tags = " ".join(rng.sample(TAG_POOL, 4))
+    circle_size = keys if keys else round(rng.uniform(2, 7), 1)
+
+    return f"""osu file format v14
+
+[General]
+AudioFilename: audio.mp3
+AudioLeadIn: 0
+PreviewTime: {rng.randint(0, 60000)}
+Countdown: 0
+SampleSet: Soft
+StackLeniency: 0.7
+Mode: {mode}
+LetterboxInBreaks: 0
+SpecialStyle: 0
+WidescreenStoryboard: 1
+
+[Editor]
+DistanceSpacing: 1
+BeatDivisor: 4
+GridSize: 4
+TimelineZoom: 1
+
+[Metadata]
+Title:{title}
+TitleUnicode:{title}
+Artist:{artist}
+ArtistUnicode:{artist}
+Creator:Mapper{set_id % 211}
+Version:Difficulty {index}
+Source:
+Tags:{tags}
+BeatmapID:{map_id}
+BeatmapSetID:{set_id}
+
+[Difficulty]
+HPDrainRate:{round(rng.uniform(5, 9), 1)}
+CircleSize:{circle_size}
+OverallDifficulty:{round(rng.uniform(5, 10), 1)}
+ApproachRate:{round(rng.uniform(5, 10), 1)}
+SliderMultiplier:1.4
+SliderTickRate:1
+
+[Events]
+//Background and Video events
+0,0,"bg.jpg",0,0
+//Break Periods
+//Storyboard Layer 0 (Background)
+//Storyboard Sound Samples
+
+[TimingPoints]
+{rng.randint(0, 500)},{round(60000 / rng.randint(120, 240), 3)},4,2,1,60,1,0
+
+
+[HitObjects]
+{hit_objects}
+"""
+
+
+# -------------------- collection.db / osu!.db --------------------
+
+def _uleb128(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def osu_string(text):
+    if text is None:
+        return b"\x00"
+    data = text.encode("utf-8")
+    return b"\x0b" + _uleb128(len(data)) + data
+
+
+def write_collection_db(path, collections, version=20240101):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<ii", version, len(collections)))
+        for name, hashes in collections:
+            f.write(osu_string(name))
+            f.write(struct.pack("<i", len(hashes)))
+            for md5 in hashes:
+                f.write(osu_string(md5))
+
+
+def _osu_db_beatmap(b):
+    out = bytearray()
+    for text in (b["artist"], b["artist"], b["title"], b["title"], b["creator"], b["version"],
+                 "audio.mp3", b["md5"], b["filename"]):
+        out += osu_string(text)
+    out += struct.pack("<bhhhq", 4, b["objects"], 0, 0, 0)
+    out += struct.pack("<ffffd", b["ar"], b["cs"], b["hp"], b["od"], 1.4)
+    out += struct.pack("<iiii", 0, 0, 0, 0)  # empty star rating tables
+    out += struct.pack("<iii", b["length"] // 1000, b["length"], 0)
+    out += struct.pack("<i", 0)  # timing points
+    out += struct.pack("<iii", b["map_id"], b["set_id"], 0)
+    out += struct.pack("<bbbbhfb", 9, 9, 9, 9, 0, 0.7, b["mode"])
+    out += osu_string("") + osu_string(b["tags"])
+    out += struct.pack("<h", 0) + osu_string("")
+    out += struct.pack("<?q?", True, 0, False)
+    out += osu_string(b["folder"])
+    out += struct.pack("<q?????ib", 0, False, False, False, False, False, 0, 0)
+    return bytes(out)
+
+
+def write_osu_db(path, beatmaps, folder_count):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<ii?q", OSU_DB_VERSION, folder_count, True, 0))
+        f.write(osu_string("Benchmark"))
+        f.write(struct.pack("<i", len(beatmaps)))
+        for b in beatmaps:
+            f.write(_osu_db_beatmap(b))
+        f.write(struct.pack("<i", 0))
+
+
+# -------------------- LIBRARY --------------------
+
+def generate_library(osu_folder, mapsets=1000, difficulties=4, hit_objects=1500,
+                     collections=10, collection_size=200, osu_db=False, seed=1):
+    # Returns the list of beatmap dicts written, one per difficulty
+    rng = random.Random(seed)
+    songs = os.path.join(osu_folder, "Songs")
+    os.makedirs(songs, exist_ok=True)
+
+    # One pool of hit-object blocks is reused so generation stays fast at 100k mapsets
+    blocks = {keys: [_hit_objects(rng, hit_objects, keys) for _ in range(4)] for keys in (4, 5, 6, 7, 8)}
+
+    beatmaps = []
+    for s in range(mapsets):
+        set_id = 100000 + s
+        folder = f"{set_id} Artist {set_id % 997} - Song {set_id}"
+        folder_path = os.path.join(songs, folder)
+        os.makedirs(folder_path, exist_ok=True)
+
+        for d in range(difficulties):
+            map_id = set_id * 10 + d
+            mode = 3 if rng.random() < 0.6 else rng.choice(MODES)
+            text = osu_file_text(rng, set_id, map_id, d, mode, rng.choice(blocks[rng.choice((4, 5, 6, 7, 8))]))
+            data = text.encode("utf-8")
+            filename = f"Artist {set_id % 997} - Song {set_id} (Mapper{set_id % 211}) [Difficulty {d}].osu"
+
+            with open(os.path.join(folder_path, filename), "wb") as f:
+                f.write(data)
+
+            beatmaps.append({
+                "set_id": set_id, "map_id": map_id, "mode": mode,
+                "md5": hashlib.md5(data).hexdigest(), "filename": filename, "folder": folder,
+                "artist": f"Artist {set_id % 997}", "title": f"Song {set_id}",
+                "creator": f"Mapper{set_id % 211}", "version": f"Difficulty {d}", "tags": "",
+                "ar": 8.0, "cs": 4.0, "hp": 7.0, "od": 8.0, "objects": hit_objects, "length": 180000,
+            })
+
+    hashes = [b["md5"] for b in beatmaps]
+    collection_list = []
+    for c in range(collections):
+        picked = rng.sample(hashes, min(collection_size, len(hashes)))
+        # A few hashes point at maps that are not installed, like a real shared collection
+        picked += [hashlib.md5(f"missing {c} {i}".encode()).hexdigest() for i in range(collection_size // 20)]
+        collection_list.append((f"Collection {c}", picked))
+    write_collection_db(os.path.join(osu_folder, "collection.db"), collection_list)
+
+    if osu_db:
+        write_osu_db(os.path.join(osu_folder, "osu!.db"), beatmaps, mapsets)
+
+    return beatmaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic osu! folder")
+    parser.add_argument("osu_folder")
+    parser.add_argument("--mapsets", type=int, default=1000)
+    parser.add_argument("--difficulties", type=int, default=4)
+    parser.add_argument("--hit-objects", type=int, default=1500)
+    parser.add_argument("--collections", type=int, default=10)
+    parser.add_argument("--collection-size", type=int, default=200)
+    parser.add_argument("--osu-db", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    beatmaps = generate_library(
+        args.osu_folder, args.mapsets, args.difficulties, args.hit_objects,
+        args.collections, args.collection_size, args.osu_db, args.seed,
+    )
+    print(f"Generated {len(beatmaps)} difficulties in {args.osu_folder}")
+
+
+if __name__ == "__main__":
+    main()
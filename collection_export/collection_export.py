@@ -1,9 +1,17 @@
 import struct
 import os
-import hashlib
+import sys
+import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from osu_library.library_index import beatmap_link
+from osu_library.index_service import open_index
+from osu_library.md5_digests import DIGEST, to_digest
+from osu_library.osz_pack import pack_mapsets, bundle_mapsets
+from osu_library import profiling
+
 # -------------------- COLLECTION.DB FUNCTIONS --------------------
 
 def read_7bit_int(f):
@@ -29,8 +37,19 @@ def read_osu_string(f):
     length = read_7bit_int(f)
     return f.read(length).decode("utf-8", errors="replace")
 
+def read_md5_digest(f):
+    # Hashes are stored as 32-character hex strings; they are kept as 16-byte digests
+    start = f.read(1)
+    if start == b'\x0b':
+        length = read_7bit_int(f)
+        return to_digest(f.read(length).decode("ascii", errors="replace"))
+    if start != b'\x00':
+        raise ValueError("Invalid string format")
+    return to_digest("")
+
 def load_collection_db(path):
-    with open(path, "rb") as f:
+    # Returns [(name, NumPy S16 array of MD5 digests)]
+    with profiling.span("load collection.db"), open(path, "rb") as f:
         version = struct.unpack("<i", f.read(4))[0]
         collection_count = struct.unpack("<i", f.read(4))[0]
 
@@ -38,38 +57,14 @@ def load_collection_db(path):
         for _ in range(collection_count):
             name = read_osu_string(f)
             beatmap_count = struct.unpack("<i", f.read(4))[0]
-            beatmaps = [read_osu_string(f) for _ in range(beatmap_count)]
-            collections.append((name, beatmaps))
+            digests = b"".join(read_md5_digest(f) for _ in range(beatmap_count))
+            collections.append((name, np.frombuffer(digests, dtype=DIGEST)))
     return collections
 
-# -------------------- OSU FILE PARSING --------------------
-
-MODE_MAP = {0: "osu", 1: "taiko", 2: "fruits", 3: "mania"}
-
-def parse_osu_file(osu_file):
-    beatmap_id = None
-    mode = None
-    with open(osu_file, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if line.startswith("BeatmapID:"):
-                beatmap_id = line.split(":")[1].strip()
-            if line.startswith("Mode:"):
-                mode_num = int(line.split(":")[1].strip())
-                mode = MODE_MAP.get(mode_num, "osu")
-            if beatmap_id and mode is not None:
-                break
-    return beatmap_id, mode
-
-def md5_file(path):
-    hash_md5 = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
 # -------------- EXPORT ----------------
 
-def export_selected_collections(selected_indices, collections, songs_folder, osu_folder, progress_var, root, listbox):
+def export_collections(selected_indices, collections, osu_folder, on_progress=None):
+    # Writes one links file per selected collection, returns (exported, missing, output folder)
     total_collections = len(selected_indices)
     exported_count = 0
     total_missing = 0
@@ -77,52 +72,99 @@ def export_selected_collections(selected_indices, collections, songs_folder, osu
     folder = os.path.join(osu_folder, "collection_exports")
     os.makedirs(folder, exist_ok=True)  # create a subfolder for exports
 
+    # MD5s come from the library index, which only re-reads mapset folders that changed since the last run
+    # (or from the index service, when it is running for this osu! folder).
+    # Downloaded .osz files that osu! has not imported yet are matched from their zip members.
+    index = open_index(osu_folder)
+
     for idx, i in enumerate(selected_indices):
-        name, md5_list = collections[i]
-        safe_name = "".join(c for c in name if c.isalnum() or c in " _-").strip()
+        name, digests = collections[i]
+        safe_name = safe_filename(name)
         out_path = os.path.join(folder, f"{safe_name}.txt")
 
-        md5_set = set(md5_list)
         beatmapset_links = {}
-
-        # Walk Songs folder to find MD5 matches
-        for root_dir, dirs, files in os.walk(songs_folder):
-            folder_name = os.path.basename(root_dir)
-            if not folder_name or not folder_name[0].isdigit():
-                continue
-            beatmapset_id = folder_name.split(" ")[0]
-
-            for file in files:
-                if not file.endswith(".osu"):
-                    continue
-                osu_path = os.path.join(root_dir, file)
-                try:
-                    file_md5 = md5_file(osu_path)
-                except:
-                    continue
-
-                if file_md5 in md5_set and beatmapset_id not in beatmapset_links:
-                    beatmap_id, mode = parse_osu_file(osu_path)
-                    if beatmap_id and mode:
-                        link = f"https://osu.ppy.sh/beatmapsets/{beatmapset_id}#{mode}/{beatmap_id}"
-                        beatmapset_links[beatmapset_id] = link
-
-            md5_set -= set(beatmapset_links.keys())
-            if not md5_set:
-                break
+        for folder_name, entry in index.find_digests(digests):
+            beatmapset_id = str(entry["mapset_id"])
+            if entry["map_id"] and beatmapset_id not in beatmapset_links:
+                beatmapset_links[beatmapset_id] = beatmap_link(entry)
 
         # Write only actual links
-        with open(out_path, "w", encoding="utf-8") as f:
+        with profiling.span("write links"), open(out_path, "w", encoding="utf-8") as f:
             for link in beatmapset_links.values():
                 f.write(link + "\n")
 
         # Count missing songs
-        missing_count = len(md5_list) - len(beatmapset_links)
+        missing_count = len(digests) - len(beatmapset_links)
         total_missing += missing_count
 
         exported_count += 1
-        progress_var.set(int((idx + 1) / total_collections * 100))
-        root.update_idletasks()
+        if on_progress:
+            on_progress(int((idx + 1) / total_collections * 100))
+
+    return exported_count, total_missing, folder
+
+def safe_filename(name):
+    return "".join(c for c in name if c.isalnum() or c in " _-").strip()
+
+def pack_collections(selected_indices, collections, osu_folder, bundle=False, level=0, workers=None, on_progress=None):
+    # Rebuilds the .osz of every mapset in the selected collections from Songs/ (archives still in
+    # Exports/ are reused as they are), one folder or one bundle zip per collection.
+    # Returns (exported, missing, output folder)
+    total_collections = len(selected_indices)
+    exported_count = 0
+    total_missing = 0
+
+    folder = os.path.join(osu_folder, "collection_exports")
+    os.makedirs(folder, exist_ok=True)
+
+    index = open_index(osu_folder)
+
+    for idx, i in enumerate(selected_indices):
+        name, digests = collections[i]
+        safe_name = safe_filename(name)
+
+        sources = {}
+        found = index.find_digests(digests)
+        for source_name, entry in found:
+            if os.path.isdir(os.path.join(index.songs_dir, source_name)):
+                sources.setdefault(f"{source_name}.osz", ("folder", os.path.join(index.songs_dir, source_name)))
+            else:
+                sources.setdefault(source_name, ("archive", os.path.join(index.exports_dir, source_name)))
+
+        def on_mapset(done, total):
+            if on_progress:
+                on_progress(int((idx + done / total) / total_collections * 100))
+
+        if bundle:
+            written, errors = bundle_mapsets(sources, os.path.join(folder, f"{safe_name}.zip"), level, on_mapset)
+        else:
+            written, errors = pack_mapsets(sources, os.path.join(folder, safe_name), level, workers, on_mapset)
+
+        for error in errors:
+            print("Error packing", error)
+        print(f"{name}: {len(sources)} mapsets packed ({written / 1024 / 1024:.1f} MB)")
+
+        total_missing += len(digests) - len(found)
+        exported_count += 1
+        if on_progress:
+            on_progress(int((idx + 1) / total_collections * 100))
+
+    return exported_count, total_missing, folder
+
+def export_selected_collections(selected_indices, collections, osu_folder, progress_var, root, listbox, mode="links"):
+    def on_progress(percent):
+        with profiling.span("gui update"):
+            progress_var.set(percent)
+            root.update_idletasks()
+
+    if mode == "links":
+        exported_count, total_missing, folder = export_collections(
+            selected_indices, collections, osu_folder, on_progress
+        )
+    else:
+        exported_count, total_missing, folder = pack_collections(
+            selected_indices, collections, osu_folder, bundle=(mode == "bundle"), on_progress=on_progress
+        )
 
     # Clear selection using the passed Listbox
     listbox.selection_clear(0, tk.END)
@@ -144,7 +186,6 @@ class OsuCollectionExporter:
         self.root.geometry("550x550")
 
         self.collections = []
-        self.songs_folder = ""
         self.collection_path = ""
         self.osu_folder = ""
 
@@ -174,6 +215,14 @@ class OsuCollectionExporter:
         self.progressbar.pack(fill=tk.X, padx=20, pady=5)
         self.progressbar.pack_forget()  # Hide initially
 
+        # Links to download, or the mapsets themselves rebuilt from Songs
+        self.mode_var = tk.StringVar(value="links")
+        mode_frame = tk.Frame(self.root)
+        mode_frame.pack(pady=5)
+        tk.Radiobutton(mode_frame, text="Links (.txt)", variable=self.mode_var, value="links").pack(side=tk.LEFT)
+        tk.Radiobutton(mode_frame, text=".osz files", variable=self.mode_var, value="osz").pack(side=tk.LEFT)
+        tk.Radiobutton(mode_frame, text="One .zip bundle", variable=self.mode_var, value="bundle").pack(side=tk.LEFT)
+
         self.export_button = tk.Button(self.root, text="Export Selected Collections", command=self.export_collections, state=tk.DISABLED)
         self.export_button.pack(pady=10)
 
@@ -199,7 +248,6 @@ class OsuCollectionExporter:
             return
 
         self.osu_folder = osu_folder
-        self.songs_folder = songs_folder
         self.collection_path = collection_path
         self.collections = load_collection_db(collection_path)
         self.populate_listbox()
@@ -222,10 +270,11 @@ class OsuCollectionExporter:
         self.export_button.config(state=tk.DISABLED)  # Disable during export
 
         export_selected_collections(
-            selected, self.collections, self.songs_folder, self.osu_folder, self.progress_var, self.root, self.listbox
+            selected, self.collections, self.osu_folder, self.progress_var, self.root, self.listbox, self.mode_var.get()
         )
 
 # -------------------- MAIN --------------------
 
 if __name__ == "__main__":
-    OsuCollectionExporter()
+    profiling.enable_from_env()
+    profiling.run(OsuCollectionExporter)
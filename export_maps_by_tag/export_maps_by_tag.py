@@ -5,13 +5,17 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
 from pathlib import Path
 import threading
-
-MODE_MAP = {
-    0: "osu",
-    1: "taiko",
-    2: "catch",
-    3: "mania"
-}
+import queue
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from osu_library.osu_header import MODE_MAP, read_header
+from osu_library.osz_index import OszIndex
+try:
+    from osu_library.index_service import connect_for
+except ImportError:  # the index service needs numpy; without it the files are scanned directly
+    connect_for = None
+from osu_library import profiling
 
 class OsuFileParser:
     #Parses a .osu file and extracts header fields such as tags, IDs, and mode
@@ -24,38 +28,22 @@ class OsuFileParser:
         self.mode = None
 
     def parse(self):
-        # Reads the .osu file until all needed fields are found
-        with self.osu_path.open("r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                if line.startswith("Tags:"):
-                    self.tags = line.split(":", 1)[1].strip()
-
-                elif line.startswith("BeatmapSetID:"):
-                    self.mapset_id = line.split(":")[1].strip()
-
-                elif line.startswith("BeatmapID:"):
-                    self.map_id = line.split(":")[1].strip()
-
-                elif line.startswith("Mode:"):
-                    mode_num = int(line.split(":")[1].strip())
-                    self.mode = MODE_MAP.get(mode_num, "osu")
-
-                # Stop early if everything found
-                if (
-                    self.tags is not None and
-                    self.mapset_id and
-                    self.map_id and
-                    self.mode
-                ):
-                    break
+        # Reads only the header sections of the .osu file
+        header = read_header(self.osu_path)
+        self.tags = header.tags
+        self.mapset_id = header.mapset_id
+        self.map_id = header.map_id
+        self.mode = header.mode_name
 
         return self  # allows chaining
 
 
 class SongScanner:
     # Scans the Songs directory for .osu files and finds maps that contain matching tags
-    def __init__(self, songs_dir: Path, target_tags: list[str]):
+    def __init__(self, songs_dir: Path, target_tags: list[str], exports_dir: Path | None = None, index=None):
         self.songs_dir = Path(songs_dir)
+        self.index = index  # a running index service answers instead of reading the files
+        self.exports_dir = Path(exports_dir) if exports_dir else None
         self.target_tags = [t.lower() for t in target_tags]
         self.matches = []
         self.mapsets_scanned = 0
@@ -70,9 +58,50 @@ class SongScanner:
         return any(tag in tags_lower for tag in self.target_tags)
 
     def scan(self):
+        # Collects every match into self.matches; iter_matches streams them instead
+        if self.index:
+            self.matches.extend(self.iter_matches())
+            return
+
+        with profiling.span("scan"):
+            self.matches.extend(self._iter_songs())
+
+        if self.exports_dir:
+            with profiling.span("scan archives"):
+                self.matches.extend(self._iter_archives())
+
+    def iter_matches(self, limit=None, cancel=None):
+        # Yields match records as they are found; stops after limit matches or once cancel (an Event) is set
+        if self.index:
+            sources = [self._iter_index(limit)]
+        else:
+            # The file scans check cancel on every file, so Stop works even when nothing matches
+            sources = [self._iter_songs(cancel)]
+            if self.exports_dir:
+                sources.append(self._iter_archives(cancel))
+
+        found = 0
+        for source in sources:
+            for match in source:
+                if cancel and cancel.is_set():
+                    return
+                yield match
+                found += 1
+                if limit and found >= limit:
+                    return
+
+    def _iter_index(self, limit=None):
+        with profiling.span("index query"):
+            self.mapsets_scanned, matches = self.index.match_tags(self.target_tags, limit)
+        yield from matches
+
+    def _iter_songs(self, cancel=None):
         last_folder = None
 
         for osu_file in self.songs_dir.rglob("*.osu"):
+            if cancel and cancel.is_set():
+                return
+            profiling.count("osu files listed")
             folder = osu_file.parent
 
             # Only scan the first .osu in each mapset folder
@@ -85,13 +114,35 @@ class SongScanner:
             parser = OsuFileParser(osu_file).parse()
 
             if self._tags_match(parser.tags):
-                self.matches.append({
+                yield {
                     "path": str(osu_file),
                     "tags": parser.tags,
                     "mapset_id": parser.mapset_id,
                     "map_id": parser.map_id,
                     "mode": parser.mode
-                })
+                }
+
+    def _iter_archives(self, cancel=None):
+        # Unimported .osz downloads are searched straight from their zip members
+        last_archive = None
+
+        for archive, entry in OszIndex(self.exports_dir, with_md5=False).refresh(cancel=cancel).entries():
+            if cancel and cancel.is_set():
+                return
+            if archive == last_archive:
+                continue
+
+            last_archive = archive
+            self.mapsets_scanned += 1
+
+            if self._tags_match(entry["tags"]):
+                yield {
+                    "path": str(self.exports_dir / archive / entry["member"]),
+                    "tags": entry["tags"],
+                    "mapset_id": entry["mapset_id"],
+                    "map_id": entry["map_id"],
+                    "mode": MODE_MAP.get(entry["mode"], "osu")
+                }
 
     def print_results(self):
         print("\n=== Scan Results ===")
@@ -99,17 +150,29 @@ class SongScanner:
         print("Matches found:", len(self.matches))
         print()
 
-    def export_links(self, output_path):
-        # Export all matched beatmapset links to a text file.
-        with open(output_path, "w", encoding="utf-8") as f:
-            for m in self.matches:
+    def export_links(self, output_path, matches=None, on_match=None):
+        # Export matched beatmapset links to a text file, one line as soon as each match arrives.
+        # matches defaults to the results of scan(); pass iter_matches() to stream instead.
+        matches = self.matches if matches is None else matches
+        count = 0
+
+        with profiling.span("write links"), open(output_path, "w", encoding="utf-8", buffering=1) as f:
+            for m in matches:
                 link = f"https://osu.ppy.sh/beatmapsets/{m['mapset_id']}"
                 f.write(link + "\n")
+                count += 1
+                if on_match:
+                    on_match(m)
 
-        print(f"\nExported {len(self.matches)} links to {output_path}")
+        print(f"\nExported {count} links to {output_path}")
+        return count
 
 
 class OsuScannerUI:
+    # The scan runs in a worker thread that only posts to self.events; the Tk thread drains them
+    POLL_MS = 50
+    EVENTS_PER_POLL = 200
+
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("osu! Tag Scanner")
@@ -132,9 +195,20 @@ class OsuScannerUI:
         self.output_label = tk.Label(self.root, text="No file selected")
         self.output_label.pack(pady=5)
 
-        # Scan button
-        self.scan_button = tk.Button(self.root, text="Start Scan", command=self.start_scan)
-        self.scan_button.pack(pady=10)
+        # Optional result limit
+        limit_frame = tk.Frame(self.root)
+        limit_frame.pack(pady=5)
+        tk.Label(limit_frame, text="Max results (optional):").pack(side=tk.LEFT)
+        self.limit_entry = tk.Entry(limit_frame, width=8)
+        self.limit_entry.pack(side=tk.LEFT)
+
+        # Scan / stop buttons
+        button_frame = tk.Frame(self.root)
+        button_frame.pack(pady=10)
+        self.scan_button = tk.Button(button_frame, text="Start Scan", command=self.start_scan)
+        self.scan_button.pack(side=tk.LEFT, padx=5)
+        self.stop_button = tk.Button(button_frame, text="Stop", command=self.stop_scan, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=5)
 
         # Progress / status
         self.status_box = scrolledtext.ScrolledText(self.root, height=15, width=70)
@@ -143,16 +217,37 @@ class OsuScannerUI:
 
         # Internal state
         self.songs_dir = None
+        self.exports_dir = None
         self.output_file = None
+        self.cancel = threading.Event()
+        self.events = queue.Queue()
 
+        self.root.after(self.POLL_MS, self.process_events)
         self.root.mainloop()
 
+    def post(self, event):
+        # Safe from any thread: a log line or a callable to run on the Tk thread
+        self.events.put(event)
+
+    def process_events(self):
+        for _ in range(self.EVENTS_PER_POLL):
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if callable(event):
+                event()
+            else:
+                self.log(event)
+        self.root.after(self.POLL_MS, self.process_events)
+
     def log(self, text):
-        self.status_box.config(state=tk.NORMAL)
-        self.status_box.insert(tk.END, text + "\n")
-        self.status_box.see(tk.END)
-        self.status_box.config(state=tk.DISABLED)
-        self.root.update_idletasks()
+        with profiling.span("gui update"):
+            self.status_box.config(state=tk.NORMAL)
+            self.status_box.insert(tk.END, text + "\n")
+            self.status_box.see(tk.END)
+            self.status_box.config(state=tk.DISABLED)
+            self.root.update_idletasks()
 
     def select_songs_folder(self):
         folder = filedialog.askdirectory(title="Select osu! Songs folder")
@@ -160,6 +255,12 @@ class OsuScannerUI:
             self.songs_dir = Path(folder)
             self.folder_label.config(text=str(folder))
 
+            # Downloads that osu! has not imported yet sit next to Songs in Exports
+            exports_dir = self.songs_dir.parent / "Exports"
+            self.exports_dir = exports_dir if exports_dir.is_dir() else None
+            if self.exports_dir:
+                self.log(f"Also searching unimported archives in: {self.exports_dir}")
+
     def select_output_file(self):
         file = filedialog.asksaveasfilename(
             title="Select output file",
@@ -182,27 +283,62 @@ class OsuScannerUI:
 
         target_tags = [t.strip() for t in tags_input.split(",") if t.strip()]
 
+        limit_input = self.limit_entry.get().strip()
+        if limit_input and not limit_input.isdigit():
+            messagebox.showwarning("Invalid limit", "Max results must be a whole number")
+            return
+        limit = int(limit_input) if limit_input else None
+
+        self.cancel.clear()
         self.scan_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.NORMAL)
         self.log("Starting scan...")
 
         # Run scan in separate thread so GUI doesn't freeze
-        threading.Thread(target=self.run_scan, args=(target_tags,), daemon=True).start()
-
-    def run_scan(self, target_tags):
-        scanner = SongScanner(self.songs_dir, target_tags)
-        scanner.scan()
-
-        self.log(f"Mapsets scanned: {scanner.mapsets_scanned}")
-        self.log(f"Matches found: {len(scanner.matches)}")
-
-        scanner.export_links(self.output_file)
-        self.log(f"Exported links to: {self.output_file}")
-
+        threading.Thread(target=profiling.run, args=(self.run_scan, target_tags, limit), daemon=True).start()
+
+    def stop_scan(self):
+        self.cancel.set()
+        self.stop_button.config(state=tk.DISABLED)
+        self.log("Stopping...")
+
+    def run_scan(self, target_tags, limit=None):
+        # Worker thread: never touches Tk, everything goes through post()
+        index = connect_for(self.songs_dir.parent) if connect_for else None
+        if index:
+            self.post("Using the running library index service")
+        scanner = SongScanner(self.songs_dir, target_tags, self.exports_dir, index)
+
+        def on_match(m):
+            self.post(f"Found: {m['mapset_id']} ({m['mode']}) {Path(m['path']).parent.name}")
+
+        count = 0
+        error = None
+        try:
+            count = scanner.export_links(self.output_file, scanner.iter_matches(limit, self.cancel), on_match)
+        except Exception as e:
+            error = e
+        finally:
+            if index:
+                index.close()
+            self.post(f"Mapsets scanned: {scanner.mapsets_scanned}")
+            self.post(f"Matches found: {count}")
+            self.post(f"Exported links to: {self.output_file}")
+            self.post(lambda: self.scan_finished(error))
+
+    def scan_finished(self, error=None):
         self.scan_button.config(state=tk.NORMAL)
-        messagebox.showinfo("Done", "Scan and export complete!")
+        self.stop_button.config(state=tk.DISABLED)
+        if error:
+            messagebox.showerror("Error", f"Scan failed: {error}")
+        elif self.cancel.is_set():
+            messagebox.showinfo("Stopped", "Scan stopped, links found so far were exported.")
+        else:
+            messagebox.showinfo("Done", "Scan and export complete!")
 
 # ------------------- Run the GUI -------------------
 
 if __name__ == "__main__":
+    profiling.enable_from_env()
     OsuScannerUI()
 
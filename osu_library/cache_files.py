@@ -0,0 +1,11 @@
+# Where the persistent library caches are written
+# By default each cache sits next to the data it describes (the osu! folder, Exports/).
+# OSU_LIBRARY_CACHE_DIR moves all of them to one folder, e.g. an empty one for a cold benchmark run.
+
+import os
+
+CACHE_DIR_ENV = "OSU_LIBRARY_CACHE_DIR"
+
+
+def cache_path(folder, filename):
+    return os.path.join(os.environ.get(CACHE_DIR_ENV) or folder, filename)
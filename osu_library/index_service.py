@@ -0,0 +1,261 @@
+# Local daemon that keeps one LibraryIndex warm and answers the tools over a Unix domain socket
+# Tools call open_index(): the daemon when it serves the same osu! folder, an in-process LibraryIndex otherwise.
+#
+#   python -m osu_library.index_service serve <osu! folder>
+#   python -m osu_library.index_service status
+#
+# Protocol, one frame per request and per reply on a persistent connection:
+#   request: op (1 byte) + body length (4 bytes, big-endian) + body
+#   reply:   status (1 byte, 0 = ok) + body length + body (the error message when status != 0)
+#
+#   OP_INFO  -                               -> JSON {osu_folder, songs_dir, exports_dir, version, mapsets}
+#   OP_FIND  N x 16-byte MD5 digests         -> JSON [[name, record], ...] for the digests found
+#   OP_SETS  -                               -> native-endian uint32 array of beatmapset ids
+#   OP_TAGS  JSON {"tags": [...], "limit": n} -> JSON {"scanned": n, "matches": [...]}
+
+import os
+import sys
+import json
+import signal
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import socketserver
+from array import array
+import numpy as np
+from osu_library import profiling
+from osu_library.library_index import LibraryIndex
+from osu_library.md5_digests import DIGEST, to_digests
+
+OP_INFO = 1
+OP_FIND = 2
+OP_SETS = 3
+OP_TAGS = 4
+
+FRAME = struct.Struct(">BI")
+CONNECT_TIMEOUT = 2.0
+
+
+class IndexServiceError(RuntimeError):
+    pass
+
+
+def default_socket_path():
+    # One daemon per user
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"osu_library_{uid}.sock")
+
+
+def same_folder(a, b):
+    return os.path.normcase(os.path.realpath(a)) == os.path.normcase(os.path.realpath(b))
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("index service closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+def _read_frame(sock):
+    code, length = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    return code, _recv_exact(sock, length) if length else b""
+
+
+# -------------------- SERVER --------------------
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        index = self.server.index
+        while True:
+            try:
+                op, body = _read_frame(self.request)
+            except ConnectionError:
+                return
+
+            try:
+                with profiling.span("service request"):
+                    reply = self._answer(index, op, body)
+                status = 0
+            except Exception as e:
+                reply, status = str(e).encode("utf-8"), 1
+            self.request.sendall(FRAME.pack(status, len(reply)) + reply)
+
+    @staticmethod
+    def _answer(index, op, body):
+        if op == OP_INFO:
+            return _dumps({
+                "osu_folder": index.osu_folder,
+                "songs_dir": index.songs_dir,
+                "exports_dir": index.exports_dir,
+                "version": index.version,
+                "mapsets": len(index.folders) + len(index.archives.archives),
+            })
+        if op == OP_FIND:
+            if len(body) % 16:
+                raise IndexServiceError("digest list is not a multiple of 16 bytes")
+            return _dumps(index.find_digests(np.frombuffer(body, dtype=DIGEST)))
+        if op == OP_SETS:
+            return array("I", sorted(index.set_ids())).tobytes()
+        if op == OP_TAGS:
+            query = json.loads(body)
+            scanned, matches = index.match_tags(query["tags"], query.get("limit"))
+            return _dumps({"scanned": scanned, "matches": matches})
+        raise IndexServiceError(f"unknown op {op}")
+
+
+def serve(osu_folder, socket_path=None, watch_library=True, interval=2.0, use_inotify=True):
+    if not hasattr(socket, "AF_UNIX"):
+        raise IndexServiceError("Unix domain sockets are not available on this platform")
+
+    socket_path = socket_path or default_socket_path()
+    existing = IndexClient.connect(socket_path)
+    if existing:
+        folder = existing.osu_folder
+        existing.close()
+        raise IndexServiceError(f"an index service for {folder} is already running on {socket_path}")
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # left behind by a daemon that did not shut down cleanly
+
+    index = LibraryIndex(osu_folder).refresh()
+    print(f"{sum(len(f['maps']) for f in index.folders.values())} difficulties in {len(index.folders)} mapsets")
+
+    stop = threading.Event()
+    if watch_library:
+        from osu_library.watcher import watch
+        threading.Thread(
+            target=watch, args=(index,), kwargs={"interval": interval, "use_inotify": use_inotify, "stop": stop},
+            daemon=True,
+        ).start()
+
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _Handler)
+    server.daemon_threads = True
+    server.index = index
+    os.chmod(socket_path, 0o600)
+    print(f"Serving the library index on {socket_path}")
+
+    # SIGTERM shuts down like Ctrl+C, so the socket file is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        os.unlink(socket_path)
+
+
+# -------------------- CLIENT --------------------
+
+class IndexClient:
+    # Same query methods as LibraryIndex, answered by the daemon
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        info = self.info()
+        self.osu_folder = info["osu_folder"]
+        self.songs_dir = info["songs_dir"]
+        self.exports_dir = info["exports_dir"]
+
+    @classmethod
+    def connect(cls, socket_path=None, timeout=CONNECT_TIMEOUT):
+        # None when no daemon is listening
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path or default_socket_path())
+            sock.settimeout(None)
+            return cls(sock)
+        except (OSError, ValueError):
+            sock.close()
+            return None
+
+    def close(self):
+        self.sock.close()
+
+    def _call(self, op, body=b""):
+        with self.lock:
+            self.sock.sendall(FRAME.pack(op, len(body)) + body)
+            status, reply = _read_frame(self.sock)
+        if status:
+            raise IndexServiceError(reply.decode("utf-8", errors="replace"))
+        return reply
+
+    def info(self):
+        return json.loads(self._call(OP_INFO))
+
+    def find_digests(self, digests):
+        return [tuple(pair) for pair in json.loads(self._call(OP_FIND, to_digests(digests).tobytes()))]
+
+    def set_ids(self):
+        ids = array("I")
+        ids.frombytes(self._call(OP_SETS))
+        return set(ids)
+
+    def match_tags(self, tags, limit=None):
+        reply = json.loads(self._call(OP_TAGS, _dumps({"tags": list(tags), "limit": limit})))
+        return reply["scanned"], reply["matches"]
+
+
+def connect_for(osu_folder, socket_path=None):
+    # The daemon, only if it serves this osu! folder
+    client = IndexClient.connect(socket_path)
+    if client and not same_folder(client.osu_folder, osu_folder):
+        client.close()
+        return None
+    return client
+
+
+def open_index(osu_folder, socket_path=None):
+    # The daemon's warm index when it serves this folder, otherwise an in-process LibraryIndex
+    return connect_for(osu_folder, socket_path) or LibraryIndex(osu_folder).refresh()
+
+
+# -------------------- CLI --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the osu! library index to the other tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = sub.add_parser("serve", help="Load the index and answer queries until interrupted")
+    serve_parser.add_argument("osu_folder")
+    serve_parser.add_argument("--socket", default=None)
+    serve_parser.add_argument("--no-watch", action="store_true", help="do not follow changes to the library")
+    serve_parser.add_argument("--interval", type=float, default=2.0, help="polling interval in seconds")
+    serve_parser.add_argument("--poll", action="store_true", help="poll even where inotify is available")
+
+    status = sub.add_parser("status", help="Show what the running service serves")
+    status.add_argument("--socket", default=None)
+
+    args = parser.parse_args()
+    profiling.enable_from_env([])
+
+    if args.command == "serve":
+        try:
+            serve(args.osu_folder, args.socket, not args.no_watch, args.interval, not args.poll)
+        except IndexServiceError as e:
+            sys.exit(str(e))
+    else:
+        client = IndexClient.connect(args.socket)
+        if not client:
+            sys.exit("No index service running")
+        info = client.info()
+        client.close()
+        print(f"{info['osu_folder']}: {info['mapsets']} mapsets, index version {info['version']}")
+
+
+if __name__ == "__main__":
+    main()
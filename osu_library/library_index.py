@@ -0,0 +1,302 @@
+# Incremental index of an osu! folder: every .osu in Songs/ (MD5, header fields, length)
+# plus the .osz archives in Exports/. Mapset folders are only re-read when their .osu files change,
+# and the index is cached next to Songs so every tool starts from a warm copy.
+
+import os
+import json
+import hashlib
+import argparse
+from threading import RLock
+from concurrent.futures import ProcessPoolExecutor
+from osu_library import cache_files, profiling
+from osu_library.osu_header import MODE_MAP, MAX_PREFIX_SIZE, TAIL_SIZE, parse_header_bytes, last_object_time
+from osu_library.osz_index import OszIndex
+from osu_library.md5_digests import DigestTable, to_digests
+
+INDEX_FILE = ".osu_library_index.json"
+PARALLEL_THRESHOLD = 32
+
+
+def folder_signature(folder_path):
+    # Count, total size and newest mtime of the .osu files: changes when a difficulty is added, removed or saved
+    count = 0
+    size = 0
+    newest = 0
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".osu"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                count += 1
+                size += st.st_size
+                newest = max(newest, st.st_mtime_ns)
+    return [count, size, newest]
+
+
+def read_folder(folder_path):
+    # Reads every .osu of a mapset folder once, for both its MD5 and its header
+    fallback_id = os.path.basename(folder_path).split(" ")[0]
+    fallback_id = int(fallback_id) if fallback_id.isdigit() else None
+    maps = []
+
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".osu"):
+                continue
+            try:
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+
+            profiling.count("bytes hashed", len(data))
+            header = parse_header_bytes(data[:MAX_PREFIX_SIZE])
+            record = {name: getattr(header, name) for name in header.__slots__}
+            record["mapset_id"] = fallback_id or record["mapset_id"]
+            record["filename"] = entry.name
+            record["md5"] = hashlib.md5(data).hexdigest()
+            record["length_ms"] = last_object_time(data[-TAIL_SIZE:])
+            maps.append(record)
+
+    return maps
+
+
+def _read_folder_job(folder_path):
+    try:
+        return folder_signature(folder_path), read_folder(folder_path)
+    except OSError:
+        return None, []
+
+
+def beatmap_link(entry):
+    return f"https://osu.ppy.sh/beatmapsets/{entry['mapset_id']}#{MODE_MAP.get(entry['mode'], 'osu')}/{entry['map_id']}"
+
+
+class LibraryIndex:
+    # folder name -> {"signature": [...], "maps": [records]} for Songs/, plus an OszIndex for Exports/
+
+    def __init__(self, osu_folder, cache_path=None):
+        self.osu_folder = str(osu_folder)
+        self.songs_dir = os.path.join(self.osu_folder, "Songs")
+        self.exports_dir = os.path.join(self.osu_folder, "Exports")
+        self.cache_path = cache_path or cache_files.cache_path(self.osu_folder, INDEX_FILE)
+        self.lock = RLock()
+        self.folders = self._load()
+        self.archives = OszIndex(self.exports_dir)
+        self.version = 0
+        self._digests = None
+        self._digests_version = -1
+        self._store = None
+        self._store_version = -1
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print("Error loading library index:", e)
+            return {}
+
+    def save(self):
+        tmp_path = self.cache_path + ".tmp"
+        with self.lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.folders, f)
+        os.replace(tmp_path, self.cache_path)
+
+    # ---------- updates ----------
+
+    def _changed(self):
+        self.version += 1
+
+    def update_folder(self, name):
+        # Re-reads one mapset folder if its .osu files changed; a missing folder is removed
+        folder_path = os.path.join(self.songs_dir, name)
+        if not os.path.isdir(folder_path):
+            return self.remove_folder(name)
+
+        try:
+            signature = folder_signature(folder_path)
+        except FileNotFoundError:
+            return self.remove_folder(name)
+        with self.lock:
+            cached = self.folders.get(name)
+            if cached and cached["signature"] == signature:
+                return False
+
+        maps = read_folder(folder_path)
+        with self.lock:
+            self.folders[name] = {"signature": signature, "maps": maps}
+            self._changed()
+        return True
+
+    def remove_folder(self, name):
+        with self.lock:
+            if self.folders.pop(name, None) is None:
+                return False
+            self._changed()
+        return True
+
+    def refresh_archives(self):
+        with self.lock:
+            before = {name: (a["size"], a["mtime"]) for name, a in self.archives.archives.items()}
+            self.archives.refresh()
+            after = {name: (a["size"], a["mtime"]) for name, a in self.archives.archives.items()}
+            if before != after:
+                self._changed()
+
+    def refresh(self, workers=None):
+        # Full incremental pass: new, removed and modified mapset folders only
+        if not os.path.isdir(self.songs_dir):
+            return self
+
+        with profiling.span("library refresh"):
+            present = {}
+            with os.scandir(self.songs_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        try:
+                            present[entry.name] = folder_signature(entry.path)
+                        except FileNotFoundError:
+                            continue
+            profiling.count("folders stat'ed", len(present))
+
+            with self.lock:
+                removed = set(self.folders) - set(present)
+                for name in removed:
+                    del self.folders[name]
+                stale = [name for name, sig in present.items()
+                         if name not in self.folders or self.folders[name]["signature"] != sig]
+
+            paths = [os.path.join(self.songs_dir, name) for name in stale]
+            if len(stale) > PARALLEL_THRESHOLD:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(profiling.merged(pool.map(profiling.pool_job(_read_folder_job), paths, chunksize=16)))
+            else:
+                results = [_read_folder_job(path) for path in paths]
+
+            with self.lock:
+                for name, (signature, maps) in zip(stale, results):
+                    if signature is not None:
+                        self.folders[name] = {"signature": signature, "maps": maps}
+                if removed or stale:
+                    self._changed()
+
+            self.refresh_archives()
+
+        if removed or stale:
+            print(f"Library index: {len(stale)} folders read, {len(removed)} removed, {len(self.folders)} total")
+            self.save()
+        return self
+
+    # ---------- queries ----------
+
+    def entries(self):
+        # Yields (folder or archive name, record) for every difficulty, Songs first then Exports
+        # Both are copied under the lock: the watcher thread adds and removes keys while handlers iterate
+        with self.lock:
+            folders = list(self.folders.items())
+            archives = list(self.archives.archives.items())
+        for name, folder in folders:
+            for record in folder["maps"]:
+                yield name, record
+        for name, archive in archives:
+            for entry in archive["entries"]:
+                yield name, entry
+
+    def digest_table(self):
+        # (name, record) list plus a DigestTable over their MD5s, rebuilt only after the index changed
+        with self.lock:
+            if self._digests_version != self.version:
+                records = [(name, record) for name, record in self.entries() if record.get("md5")]
+                self._digests = (records, DigestTable([record["md5"] for _, record in records]))
+                self._digests_version = self.version
+            return self._digests
+
+    def find_digests(self, digests):
+        # (name, record) for every digest present in the library, in the order given
+        records, table = self.digest_table()
+        return [records[row] for row in table.lookup(digests) if row >= 0]
+
+    def find_md5(self, md5_list):
+        records, table = self.digest_table()
+        return {md5: records[row] for md5, row in zip(md5_list, table.lookup(to_digests(md5_list))) if row >= 0}
+
+    def mapsets(self):
+        # (folder or archive name, first record) per mapset, Songs first then Exports
+        last = None
+        for name, record in self.entries():
+            if name != last:
+                last = name
+                yield name, record
+
+    def set_ids(self):
+        return {record["mapset_id"] for _, record in self.entries() if record.get("mapset_id")}
+
+    def record_path(self, name, record):
+        if name in self.folders:
+            return os.path.join(self.songs_dir, name, record["filename"])
+        return os.path.join(self.exports_dir, name, record["member"])
+
+    def match_tags(self, tags, limit=None):
+        # Mapsets whose first difficulty has any of the tags, as (mapsets checked, [match records])
+        tags = [tag.lower() for tag in tags]
+        scanned = 0
+        matches = []
+        for name, record in self.mapsets():
+            scanned += 1
+            record_tags = (record.get("tags") or "").lower()
+            if record_tags and any(tag in record_tags for tag in tags):
+                matches.append({
+                    "path": self.record_path(name, record),
+                    "tags": record["tags"],
+                    "mapset_id": record["mapset_id"],
+                    "map_id": record["map_id"],
+                    "mode": MODE_MAP.get(record["mode"], "osu"),
+                })
+                if limit and len(matches) >= limit:
+                    break
+        return scanned, matches
+
+    def store(self):
+        # Columnar snapshot for vectorized filters, rebuilt only after the index changed
+        from osu_library.metadata_store import MetadataStore
+
+        with self.lock:
+            if self._store_version != self.version:
+                records = []
+                for name, record in self.entries():
+                    archived = 0 if name in self.folders else 1
+                    records.append(dict(record, folder=name, filename=record.get("filename") or record.get("member"),
+                                        archived=archived))
+                self._store = MetadataStore.from_records(records)
+                self._store_version = self.version
+            return self._store
+
+
+# -------------------- CLI --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep an index of an osu! folder up to date")
+    parser.add_argument("command", choices=("refresh", "watch"))
+    parser.add_argument("osu_folder")
+    parser.add_argument("--interval", type=float, default=2.0, help="polling interval in seconds")
+    parser.add_argument("--poll", action="store_true", help="poll even where inotify is available")
+    args = parser.parse_args()
+
+    profiling.enable_from_env([])
+    index = LibraryIndex(args.osu_folder).refresh()
+    print(f"{sum(len(f['maps']) for f in index.folders.values())} difficulties in {len(index.folders)} mapsets")
+
+    if args.command == "watch":
+        from osu_library.watcher import watch
+        watch(index, interval=args.interval, use_inotify=not args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# Vectorized [HitObjects] / [TimingPoints] analysis of mania difficulties
+# Each difficulty becomes NumPy arrays of column, start and end time; LN ratio, note density,
+# chord and jack statistics and a rough star bucket are computed from those arrays.
+# Results are cached by MD5 next to Songs, so only new difficulties are analyzed on later runs.
+#
+#   python -m osu_library.mania_analysis lists <osu! folder> <out dir>
+#   python -m osu_library.mania_analysis query <osu! folder> out.txt --keys 7 --min-ln 0.5
+
+import os
+import re
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from osu_library import cache_files, profiling
+from osu_library.osu_header import MAX_PREFIX_SIZE, parse_header_bytes
+from osu_library.library_index import LibraryIndex, beatmap_link
+
+CACHE_FILE = ".mania_features.json"
+MANIA = 3
+LN_TYPE = 128
+JACK_MS = 150          # same-column notes at most this far apart count as a jack
+WINDOW_MS = 1000       # density window
+LN_LIST_RATIO = 0.5    # at least this share of long notes goes in the LN list
+RICE_LIST_RATIO = 0.1  # at most this share goes in the rice list
+BUCKET_SIZE = 0.5
+
+# x,y,time,type,hitSound[,endTime:hitSample | hitSample]; the last group is endTime only when type has LN_TYPE
+HIT_OBJECT = re.compile(rb"^(\d+(?:\.\d+)?),[^,\r\n]*,(-?\d+(?:\.\d+)?),(\d+),[^,\r\n]*(?:,(-?\d+))?", re.M)
+TIMING_POINT = re.compile(rb"^(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)", re.M)
+
+FEATURES = ("keys", "notes", "ln_ratio", "duration_s", "nps", "peak_nps", "chord_ratio", "mean_chord",
+            "jack_ratio", "bpm", "approx_stars")
+
+
+def section(data, name):
+    start = data.find(name)
+    if start < 0:
+        return b""
+    start += len(name)
+    end = data.find(b"\n[", start)
+    return data[start:] if end < 0 else data[start:end]
+
+
+def _numbers(matches, columns):
+    # One bulk conversion of the regex groups; missing optional groups are empty and read as 0
+    if not matches:
+        return np.zeros((0, columns))
+    raw = np.array(matches, dtype="S24")
+    raw[raw == b""] = b"0"
+    return raw.astype(np.float64)
+
+
+def parse_hit_objects(data, keys):
+    # Returns (columns, starts, ends) sorted by start time; ends equal starts for normal notes
+    values = _numbers(HIT_OBJECT.findall(section(data, b"[HitObjects]")), 4)
+    profiling.count("hit objects parsed", len(values))
+
+    columns = np.clip((values[:, 0] * keys // 512).astype(np.int8), 0, keys - 1)
+    starts = values[:, 1].astype(np.int32)
+    is_ln = (values[:, 2].astype(np.int32) & LN_TYPE) != 0
+    ends = np.where(is_ln, values[:, 3], values[:, 1]).astype(np.int32)
+
+    order = np.argsort(starts, kind="stable")
+    return columns[order], starts[order], ends[order]
+
+
+def parse_timing_points(data):
+    # Returns (times, beat lengths) of the uninherited (BPM) timing points
+    values = _numbers(TIMING_POINT.findall(section(data, b"[TimingPoints]")), 2)
+    uninherited = values[:, 1] > 0
+    return values[uninherited, 0], values[uninherited, 1]
+
+
+def dominant_bpm(times, beat_lengths, end_time):
+    # BPM held for the longest stretch of the map
+    if not len(times):
+        return 0.0
+    durations = np.diff(np.append(times, max(end_time, times[-1])))
+    return float(60000 / beat_lengths[np.argmax(durations)])
+
+
+def approx_stars(p90_nps, keys, ln_ratio, jack_ratio):
+    # Rough density-based estimate for bucketing lists, not osu!'s star rating
+    strain = p90_nps * (1 + 0.5 * ln_ratio) * (1 + 0.5 * jack_ratio)
+    return float(0.55 * strain ** 0.85 * (4 / keys) ** 0.4)
+
+
+def hit_object_features(columns, starts, ends, keys, timing=None):
+    n = len(starts)
+    if not n:
+        return None
+
+    is_ln = ends > starts
+    ln_ratio = float(is_ln.mean())
+    end_time = int(max(ends.max(), starts[-1]))
+    duration = max(end_time - int(starts[0]), 1) / 1000
+
+    # Notes in the window starting at each note
+    window = np.searchsorted(starts, starts + WINDOW_MS) - np.arange(n)
+    p90 = float(np.percentile(window, 90))
+
+    # Chords: notes sharing a start time
+    _, counts = np.unique(starts, return_counts=True)
+    chord_ratio = float(counts[counts >= 2].sum() / n)
+
+    # Jacks: consecutive notes in the same column close together
+    order = np.lexsort((starts, columns))
+    same_column = columns[order][1:] == columns[order][:-1]
+    gaps = np.diff(starts[order])
+    jack_ratio = float((same_column & (gaps > 0) & (gaps <= JACK_MS)).sum() / n)
+
+    return {
+        "keys": keys,
+        "notes": n,
+        "ln_ratio": round(ln_ratio, 4),
+        "duration_s": round(duration, 1),
+        "nps": round(n / duration, 2),
+        "peak_nps": int(window.max()),
+        "chord_ratio": round(chord_ratio, 4),
+        "mean_chord": round(n / len(counts), 3),
+        "jack_ratio": round(jack_ratio, 4),
+        "bpm": round(dominant_bpm(*timing, end_time), 1) if timing else 0.0,
+        "approx_stars": round(approx_stars(p90, keys, ln_ratio, jack_ratio), 2),
+    }
+
+
+def analyze_bytes(data):
+    header = parse_header_bytes(data[:MAX_PREFIX_SIZE])
+    if header.mode != MANIA:
+        return None
+    keys = int(round(header.circle_size or 4)) or 4
+    with profiling.span("analyze hit objects"):
+        return hit_object_features(*parse_hit_objects(data, keys), keys, parse_timing_points(data))
+
+
+def _analyze_job(job):
+    md5, path = job
+    try:
+        with open(path, "rb") as f:
+            return md5, analyze_bytes(f.read())
+    except (OSError, ValueError) as e:
+        print(f"Error analyzing {path}: {e}")
+        return md5, None
+
+
+def star_bucket(stars):
+    low = np.floor(stars / BUCKET_SIZE) * BUCKET_SIZE
+    return f"{low:.2f}-{low + BUCKET_SIZE:g} stars"
+
+
+# -------------------- LIBRARY --------------------
+
+class ManiaLibrary:
+    # Feature columns of every mania difficulty in Songs/, with the records they came from
+
+    def __init__(self, records):
+        self.records = records
+        self.columns = {name: np.array([r[name] for r in records], dtype=np.float64) for name in FEATURES}
+
+    def __len__(self):
+        return len(self.records)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def range_mask(self, name, low=None, high=None):
+        values = self.columns[name]
+        mask = np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def filter(self, keys=None, min_ln=None, max_ln=None, min_stars=None, max_stars=None,
+               min_nps=None, max_nps=None, min_jack=None, min_chord=None):
+        mask = self.range_mask("ln_ratio", min_ln, max_ln)
+        mask &= self.range_mask("approx_stars", min_stars, max_stars)
+        mask &= self.range_mask("nps", min_nps, max_nps)
+        mask &= self.range_mask("jack_ratio", min_jack)
+        mask &= self.range_mask("chord_ratio", min_chord)
+        if keys is not None:
+            mask &= self.columns["keys"] == keys
+        return mask
+
+    def links(self, mask):
+        # One link per difficulty, in library order
+        return [beatmap_link(self.records[i]) for i in np.flatnonzero(mask)]
+
+
+def _load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print("Error loading mania features:", e)
+        return {}
+
+
+def analyze_library(osu_folder, workers=None, cache_path=None):
+    # Analyzes every mania difficulty of Songs/ not analyzed yet, on a process pool
+    index = LibraryIndex(osu_folder).refresh()
+    cache_path = cache_path or cache_files.cache_path(index.osu_folder, CACHE_FILE)
+    cache = _load_cache(cache_path)
+
+    mania = [(name, record) for name, folder in index.folders.items() for record in folder["maps"]
+             if record["mode"] == MANIA and record.get("md5")]
+    jobs = [(record["md5"], os.path.join(index.songs_dir, name, record["filename"]))
+            for name, record in mania if record["md5"] not in cache]
+
+    if jobs:
+        with profiling.span("analyze library"), ProcessPoolExecutor(max_workers=workers) as pool:
+            for md5, features in profiling.merged(pool.map(profiling.pool_job(_analyze_job), jobs, chunksize=32)):
+                cache[md5] = features
+
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+        print(f"Analyzed {len(jobs)} mania difficulties ({len(mania) - len(jobs)} cached)")
+
+    records = [dict(record, **cache[record["md5"]]) for _, record in mania if cache.get(record["md5"])]
+    return ManiaLibrary(records)
+
+
+def write_links(path, links):
+    with open(path, "w", encoding="utf-8") as f:
+        for link in links:
+            f.write(link + "\n")
+    print(f"{len(links):>6} links -> {path}")
+
+
+def write_lists(library, out_dir):
+    # The hand-curated Resources lists: <k>k_ln, <k>k_rice and one list per star bucket
+    os.makedirs(out_dir, exist_ok=True)
+    keys = library.column("keys")
+    for k in np.unique(keys).astype(int):
+        write_links(os.path.join(out_dir, f"{k}k_ln_list.txt"), library.links(library.filter(keys=k, min_ln=LN_LIST_RATIO)))
+        write_links(os.path.join(out_dir, f"{k}k_rice_list.txt"), library.links(library.filter(keys=k, max_ln=RICE_LIST_RATIO)))
+
+    buckets = np.floor(library.column("approx_stars") / BUCKET_SIZE) * BUCKET_SIZE
+    for low in np.unique(buckets):
+        write_links(os.path.join(out_dir, f"{star_bucket(low)}_list.txt"), library.links(buckets == low))
+
+
+# -------------------- CLI --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze mania hit objects and generate beatmap lists")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    lists = sub.add_parser("lists", help="Write LN, rice and star-bucket lists for every key count")
+    lists.add_argument("osu_folder")
+    lists.add_argument("out_dir")
+    lists.add_argument("--workers", type=int, default=None)
+
+    query = sub.add_parser("query", help="Filter the analyzed difficulties and export links")
+    query.add_argument("osu_folder")
+    query.add_argument("output")
+    query.add_argument("--workers", type=int, default=None)
+    query.add_argument("--keys", type=int)
+    query.add_argument("--min-ln", type=float)
+    query.add_argument("--max-ln", type=float)
+    query.add_argument("--min-stars", type=float)
+    query.add_argument("--max-stars", type=float)
+    query.add_argument("--min-nps", type=float)
+    query.add_argument("--max-nps", type=float)
+    query.add_argument("--min-jack", type=float)
+    query.add_argument("--min-chord", type=float)
+
+    args = parser.parse_args()
+    profiling.enable_from_env([])
+    library = analyze_library(args.osu_folder, args.workers)
+
+    if args.command == "lists":
+        write_lists(library, args.out_dir)
+    else:
+        mask = library.filter(args.keys, args.min_ln, args.max_ln, args.min_stars, args.max_stars,
+                              args.min_nps, args.max_nps, args.min_jack, args.min_chord)
+        write_links(args.output, library.links(mask))
+
+
+if __name__ == "__main__":
+    main()
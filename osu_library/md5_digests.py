@@ -0,0 +1,56 @@
+# Beatmap MD5s as 16-byte digests in NumPy arrays
+# A hex str costs ~80 bytes plus a set/dict slot; a digest costs 16 bytes, and lookups
+# are a binary search over a sorted array instead of hashing strings.
+
+import numpy as np
+
+DIGEST = np.dtype("S16")
+EMPTY = b"\0" * 16
+
+
+def to_digest(md5):
+    # Anything that is not a 32-character hex string becomes the all-zero digest, which never matches
+    try:
+        digest = bytes.fromhex(md5)
+    except (TypeError, ValueError):
+        return EMPTY
+    return digest if len(digest) == 16 else EMPTY
+
+
+def to_digests(md5_list):
+    if isinstance(md5_list, np.ndarray) and md5_list.dtype == DIGEST:
+        return md5_list
+    out = bytearray(16 * len(md5_list))
+    for i, md5 in enumerate(md5_list):
+        out[i * 16:i * 16 + 16] = to_digest(md5)
+    return np.frombuffer(bytes(out), dtype=DIGEST)
+
+
+def to_hex(digest):
+    # NumPy strips trailing zero bytes from S16 items
+    return bytes(digest).ljust(16, b"\0").hex()
+
+
+class DigestTable:
+    # Sorted digests plus the row each one came from; the first row wins for duplicates
+
+    def __init__(self, digests, rows=None):
+        digests = to_digests(digests)
+        order = np.argsort(digests, kind="stable")
+        self.digests = digests[order]
+        self.rows = order if rows is None else np.asarray(rows)[order]
+
+    def __len__(self):
+        return len(self.digests)
+
+    def lookup(self, digests):
+        # Row of every digest, -1 where it is not in the table
+        digests = to_digests(digests)
+        if not len(self.digests):
+            return np.full(len(digests), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.digests, digests), len(self.digests) - 1)
+        found = (self.digests[positions] == digests) & (digests != EMPTY)
+        return np.where(found, self.rows[positions], -1)
+
+    def contains(self, digests):
+        return self.lookup(digests) >= 0
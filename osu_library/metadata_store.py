@@ -0,0 +1,264 @@
+# Columnar metadata store for every difficulty in an osu! Songs folder
+# Numeric fields live in NumPy arrays and string fields are interned (codes + vocabulary),
+# so filters like "mania, 7K, OD >= 8, tag contains 'ln'" run as vectorized masks.
+
+import os
+import argparse
+import numpy as np
+from osu_library.osu_header import MODE_MAP, TAIL_SIZE, read_prefix, parse_header_bytes, last_object_time
+from osu_library.osz_index import OszIndex
+
+MODE_IDS = {name: num for num, name in MODE_MAP.items()}
+
+NUMERIC_FIELDS = {
+    "mapset_id": np.int64,
+    "map_id": np.int64,
+    "mode": np.int8,
+    "circle_size": np.float32,
+    "overall_difficulty": np.float32,
+    "hp_drain_rate": np.float32,
+    "approach_rate": np.float32,
+    "length_ms": np.int32,
+    "archived": np.int8,
+}
+
+STRING_FIELDS = ("folder", "filename", "artist", "title", "creator", "version", "tags")
+
+
+def _read_tail(f):
+    # Only the tail of the file is read to find the map length
+    f.seek(0, os.SEEK_END)
+    f.seek(max(0, f.tell() - TAIL_SIZE))
+    return f.read()
+
+
+def read_metadata(osu_path):
+    # Reads the header fields of one .osu file into a dict, plus the length from the file tail
+    with open(osu_path, "rb") as f:
+        header = parse_header_bytes(read_prefix(f))
+        record = {name: getattr(header, name) for name in header.__slots__}
+        record["length_ms"] = last_object_time(_read_tail(f))
+
+    return record
+
+
+def _to_number(value, dtype):
+    try:
+        return dtype(float(value))
+    except (TypeError, ValueError):
+        return dtype(-1)
+
+
+class MetadataStore:
+    # Holds one row per difficulty: NumPy arrays for numbers, codes + vocab for strings
+
+    def __init__(self, numeric, codes, vocabs):
+        self.numeric = numeric
+        self.codes = codes
+        self.vocabs = vocabs
+
+    def __len__(self):
+        return len(self.numeric["map_id"])
+
+    # ---------- building ----------
+
+    @classmethod
+    def from_records(cls, records):
+        numeric = {
+            name: np.fromiter((_to_number(r.get(name), dtype) for r in records), dtype=dtype, count=len(records))
+            for name, dtype in NUMERIC_FIELDS.items()
+        }
+
+        codes = {}
+        vocabs = {}
+        for name in STRING_FIELDS:
+            interned = {}
+            column = np.empty(len(records), dtype=np.uint32)
+            for i, r in enumerate(records):
+                column[i] = interned.setdefault(r.get(name) or "", len(interned))
+            codes[name] = column
+            vocabs[name] = np.array(list(interned), dtype=str)
+
+        return cls(numeric, codes, vocabs)
+
+    @classmethod
+    def build(cls, songs_dir, exports_dir=None):
+        # Scans every mapset folder of Songs/ and reads all .osu headers
+        # With exports_dir, unimported .osz downloads are indexed from their zip members too
+        records = []
+
+        with os.scandir(songs_dir) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                fallback_id = folder.name.split(" ")[0]
+
+                with os.scandir(folder.path) as files:
+                    for entry in files:
+                        if not entry.name.endswith(".osu"):
+                            continue
+                        try:
+                            record = read_metadata(entry.path)
+                        except OSError:
+                            continue
+
+                        if record["mapset_id"] is None and fallback_id.isdigit():
+                            record["mapset_id"] = fallback_id
+                        record["folder"] = folder.name
+                        record["filename"] = entry.name
+                        record["archived"] = 0
+                        records.append(record)
+
+        if exports_dir:
+            for archive, entry in OszIndex(exports_dir, with_md5=False).refresh().entries():
+                record = dict(entry, folder=archive, filename=entry["member"], archived=1)
+                records.append(record)
+
+        return cls.from_records(records)
+
+    # ---------- persistence ----------
+
+    def save(self, path):
+        arrays = dict(self.numeric)
+        for name in STRING_FIELDS:
+            arrays[f"{name}__codes"] = self.codes[name]
+            arrays[f"{name}__vocab"] = self.vocabs[name]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            numeric = {name: data[name] for name in NUMERIC_FIELDS}
+            codes = {name: data[f"{name}__codes"] for name in STRING_FIELDS}
+            vocabs = {name: data[f"{name}__vocab"] for name in STRING_FIELDS}
+        return cls(numeric, codes, vocabs)
+
+    # ---------- columns and masks ----------
+
+    def column(self, name):
+        if name in self.numeric:
+            return self.numeric[name]
+        return self.vocabs[name][self.codes[name]]
+
+    def range_mask(self, name, low=None, high=None):
+        values = self.numeric[name]
+        mask = np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def equals_mask(self, name, value):
+        if name in self.numeric:
+            return self.numeric[name] == value
+        matches = self.vocabs[name] == value
+        return matches[self.codes[name]]
+
+    def contains_mask(self, name, text):
+        # Substring test runs once per unique string, then is broadcast to every row through the codes
+        vocab = np.char.lower(self.vocabs[name])
+        hits = np.char.find(vocab, text.lower()) >= 0
+        return hits[self.codes[name]]
+
+    def filter(self, mode=None, keys=None, min_od=None, max_od=None, min_hp=None, max_hp=None,
+               min_length=None, max_length=None, creator=None, artist=None, tags=()):
+        mask = np.ones(len(self), dtype=bool)
+
+        if mode is not None:
+            mask &= self.equals_mask("mode", MODE_IDS[mode] if isinstance(mode, str) else mode)
+        if keys is not None:
+            # Mania key count is stored as CircleSize
+            mask &= self.equals_mask("circle_size", keys)
+        if min_od is not None or max_od is not None:
+            mask &= self.range_mask("overall_difficulty", min_od, max_od)
+        if min_hp is not None or max_hp is not None:
+            mask &= self.range_mask("hp_drain_rate", min_hp, max_hp)
+        if min_length is not None or max_length is not None:
+            mask &= self.range_mask("length_ms", min_length, max_length)
+        if creator:
+            mask &= self.contains_mask("creator", creator)
+        if artist:
+            mask &= self.contains_mask("artist", artist)
+        for tag in tags:
+            mask &= self.contains_mask("tags", tag)
+
+        return mask
+
+    # ---------- export ----------
+
+    def links(self, mask, one_per_mapset=True):
+        # Yields download links in the same format as the Resources/*_list.txt files
+        seen = set()
+        rows = np.flatnonzero(mask)
+
+        for set_id, map_id, mode in zip(self.numeric["mapset_id"][rows],
+                                        self.numeric["map_id"][rows],
+                                        self.numeric["mode"][rows]):
+            if one_per_mapset:
+                if set_id in seen:
+                    continue
+                seen.add(set_id)
+            yield f"https://osu.ppy.sh/beatmapsets/{set_id}#{MODE_MAP.get(int(mode), 'osu')}/{map_id}"
+
+    def export_links(self, mask, output_path, one_per_mapset=True):
+        count = 0
+        with open(output_path, "w", encoding="utf-8") as f:
+            for link in self.links(mask, one_per_mapset):
+                f.write(link + "\n")
+                count += 1
+
+        print(f"Exported {count} links to {output_path}")
+        return count
+
+
+# -------------------- CLI --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a columnar osu! metadata store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Scan a Songs folder into a .npz store")
+    build.add_argument("songs_dir")
+    build.add_argument("store")
+    build.add_argument("--exports", help="also index the .osz archives of this Exports folder")
+
+    query = sub.add_parser("query", help="Filter a store and export links")
+    query.add_argument("store")
+    query.add_argument("output")
+    query.add_argument("--mode", choices=list(MODE_IDS))
+    query.add_argument("--keys", type=float)
+    query.add_argument("--min-od", type=float)
+    query.add_argument("--max-od", type=float)
+    query.add_argument("--min-hp", type=float)
+    query.add_argument("--max-hp", type=float)
+    query.add_argument("--min-length", type=int, help="milliseconds")
+    query.add_argument("--max-length", type=int, help="milliseconds")
+    query.add_argument("--creator")
+    query.add_argument("--artist")
+    query.add_argument("--tag", action="append", default=[])
+    query.add_argument("--all-difficulties", action="store_true")
+    query.add_argument("--imported-only", action="store_true", help="skip maps that only exist as .osz archives")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        store = MetadataStore.build(args.songs_dir, args.exports)
+        store.save(args.store)
+        print(f"Stored {len(store)} difficulties in {args.store}")
+    else:
+        store = MetadataStore.load(args.store)
+        mask = store.filter(
+            mode=args.mode, keys=args.keys,
+            min_od=args.min_od, max_od=args.max_od,
+            min_hp=args.min_hp, max_hp=args.max_hp,
+            min_length=args.min_length, max_length=args.max_length,
+            creator=args.creator, artist=args.artist, tags=args.tag,
+        )
+        if args.imported_only:
+            mask &= store.equals_mask("archived", 0)
+        store.export_links(mask, args.output, one_per_mapset=not args.all_difficulties)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Shared bytes-level .osu header parser
+# Only [General], [Metadata] and [Difficulty] are read, from a bounded prefix of the file,
+# and parsing stops hard at the first event / timing / hit-object section.
+
+from osu_library import profiling
+
+MODE_MAP = {0: "osu", 1: "taiko", 2: "fruits", 3: "mania"}
+
+PREFIX_SIZE = 8192
+MAX_PREFIX_SIZE = 65536
+TAIL_SIZE = 4096
+
+HEADER_SECTIONS = (b"[General]", b"[Metadata]", b"[Difficulty]")
+STOP_SECTIONS = (b"[Events]", b"[TimingPoints]", b"[Colours]", b"[HitObjects]")
+
+INT_KEYS = {
+    b"Mode": "mode",
+    b"BeatmapID": "map_id",
+    b"BeatmapSetID": "mapset_id",
+}
+
+FLOAT_KEYS = {
+    b"HPDrainRate": "hp_drain_rate",
+    b"CircleSize": "circle_size",
+    b"OverallDifficulty": "overall_difficulty",
+    b"ApproachRate": "approach_rate",
+}
+
+TEXT_KEYS = {
+    b"Title": "title",
+    b"Artist": "artist",
+    b"Creator": "creator",
+    b"Version": "version",
+    b"Tags": "tags",
+}
+
+
+class OsuHeader:
+    # Compact record of the header fields of one difficulty
+
+    __slots__ = (
+        "mapset_id", "map_id", "mode",
+        "title", "artist", "creator", "version", "tags",
+        "hp_drain_rate", "circle_size", "overall_difficulty", "approach_rate",
+    )
+
+    def __init__(self):
+        self.mapset_id = None
+        self.map_id = None
+        self.mode = 0
+        self.title = None
+        self.artist = None
+        self.creator = None
+        self.version = None
+        self.tags = None
+        self.hp_drain_rate = None
+        self.circle_size = None
+        self.overall_difficulty = None
+        self.approach_rate = None
+
+    @property
+    def mode_name(self):
+        return MODE_MAP.get(self.mode, "osu")
+
+    def link(self, mapset_id=None):
+        return f"https://osu.ppy.sh/beatmapsets/{mapset_id or self.mapset_id}#{self.mode_name}/{self.map_id}"
+
+    def __repr__(self):
+        return f"OsuHeader(mapset_id={self.mapset_id}, map_id={self.map_id}, mode={self.mode_name!r}, version={self.version!r})"
+
+
+def _has_stop_section(data):
+    return any(section in data for section in STOP_SECTIONS)
+
+
+def read_prefix(f):
+    # Reads from a binary file object until a stop section shows up or MAX_PREFIX_SIZE is hit
+    data = f.read(PREFIX_SIZE)
+    while len(data) < MAX_PREFIX_SIZE and not _has_stop_section(data):
+        chunk = f.read(PREFIX_SIZE)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def parse_header_bytes(data):
+    profiling.count("headers parsed")
+    profiling.count("header bytes read", len(data))
+    header = OsuHeader()
+    in_header = False
+
+    for raw in data.split(b"\n"):
+        line = raw.strip()
+        if not line:
+            continue
+
+        if line[:1] == b"[":
+            if line in STOP_SECTIONS:
+                break
+            in_header = line in HEADER_SECTIONS
+            continue
+
+        if not in_header:
+            continue
+
+        key, sep, value = line.partition(b":")
+        if not sep:
+            continue
+        key = key.strip()
+        value = value.strip()
+
+        try:
+            if key in INT_KEYS:
+                setattr(header, INT_KEYS[key], int(value))
+            elif key in FLOAT_KEYS:
+                setattr(header, FLOAT_KEYS[key], float(value))
+            elif key in TEXT_KEYS:
+                setattr(header, TEXT_KEYS[key], value.decode("utf-8", errors="ignore"))
+        except ValueError:
+            continue
+
+    if header.mapset_id is not None and header.mapset_id <= 0:
+        header.mapset_id = None
+
+    return header
+
+
+def read_header(osu_path):
+    with profiling.span("parse header"), open(osu_path, "rb") as f:
+        return parse_header_bytes(read_prefix(f))
+
+
+def last_object_time(tail):
+    # The last [HitObjects] line of a file tail holds the map length in milliseconds
+    for line in reversed(tail.split(b"\n")):
+        parts = line.strip().split(b",")
+        if len(parts) >= 3:
+            try:
+                return int(float(parts[2]))
+            except ValueError:
+                continue
+    return 0
@@ -0,0 +1,156 @@
+# Index of the .osz archives in an Exports folder, read without extracting them
+# Every .osu member is hashed as a stream and only its header prefix is parsed.
+# Archives are read on a process pool and cached by size and mtime.
+
+import os
+import json
+import zlib
+import hashlib
+from re import match
+from zipfile import ZipFile, BadZipFile
+from concurrent.futures import ProcessPoolExecutor
+from osu_library import cache_files, profiling
+from osu_library.osu_header import MAX_PREFIX_SIZE, TAIL_SIZE, read_prefix, parse_header_bytes, last_object_time
+
+CACHE_FILE = ".osz_index.json"
+CHUNK_SIZE = 65536
+
+
+def archive_mapset_id(archive_name):
+    # "<id> Artist - Title.osz" and "<id>.osz" both start with the beatmapset id
+    if m := match(r"(\d+)", archive_name):
+        return int(m.group(1))
+    return None
+
+
+def _read_member(member, with_md5):
+    if not with_md5:
+        return None, read_prefix(member), b""
+
+    md5 = hashlib.md5()
+    prefix = b""
+    tail = b""
+    for chunk in iter(lambda: member.read(CHUNK_SIZE), b""):
+        md5.update(chunk)
+        if len(prefix) < MAX_PREFIX_SIZE:
+            prefix += chunk[:MAX_PREFIX_SIZE - len(prefix)]
+        tail = (tail + chunk)[-TAIL_SIZE:]
+    return md5.hexdigest(), prefix, tail
+
+
+def read_archive(archive_path, with_md5=True):
+    # Returns one entry per .osu member of the archive
+    entries = []
+    fallback_id = archive_mapset_id(os.path.basename(archive_path))
+
+    with ZipFile(archive_path) as zf:
+        for info in zf.infolist():
+            if not info.filename.lower().endswith(".osu"):
+                continue
+
+            with zf.open(info) as member:
+                md5, prefix, tail = _read_member(member, with_md5)
+
+            header = parse_header_bytes(prefix)
+            entry = {name: getattr(header, name) for name in header.__slots__}
+            entry["mapset_id"] = entry["mapset_id"] or fallback_id
+            entry["member"] = info.filename
+            entry["md5"] = md5
+            entry["length_ms"] = last_object_time(tail) if tail else None
+            entries.append(entry)
+
+    return entries
+
+
+def _read_archive_safe(args):
+    archive_path, with_md5 = args
+    try:
+        return read_archive(archive_path, with_md5), None
+    except (BadZipFile, OSError, EOFError, ValueError, zlib.error) as e:
+        # zlib.error: a damaged deflate stream inside an otherwise readable archive
+        return [], str(e)
+
+
+class OszIndex:
+    # Keeps the entries of every archive in exports_dir, refreshed incrementally
+
+    def __init__(self, exports_dir, cache_path=None, with_md5=True):
+        self.exports_dir = str(exports_dir)
+        self.cache_path = cache_path or cache_files.cache_path(self.exports_dir, CACHE_FILE)
+        self.with_md5 = with_md5
+        self.archives = self._load_cache()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print("Error loading archive index cache:", e)
+            return {}
+
+    def save(self):
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.archives, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _is_current(self, name, stat):
+        cached = self.archives.get(name)
+        if not cached or cached["size"] != stat.st_size or cached["mtime"] != stat.st_mtime:
+            return False
+        if self.with_md5 and not cached["has_md5"]:
+            return False
+        return True
+
+    def refresh(self, workers=None, cancel=None):
+        # cancel: an Event; archives read before it is set are kept, the others are read by the next refresh
+        if not os.path.isdir(self.exports_dir):
+            return self
+
+        stats = {}
+        with os.scandir(self.exports_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(".osz"):
+                    try:
+                        stats[entry.name] = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+        for name in set(self.archives) - set(stats):
+            del self.archives[name]
+
+        stale = [name for name, stat in stats.items() if not self._is_current(name, stat)]
+        profiling.count("archives stat'ed", len(stats))
+        profiling.count("archives read", len(stale))
+        if stale and not (cancel and cancel.is_set()):
+            jobs = [(os.path.join(self.exports_dir, name), self.with_md5) for name in stale]
+            read = 0
+            with profiling.span("read archives"), ProcessPoolExecutor(max_workers=workers) as pool:
+                results = profiling.merged(pool.map(profiling.pool_job(_read_archive_safe), jobs, chunksize=8))
+                for name, (entries, error) in zip(stale, results):
+                    self.archives[name] = {
+                        "size": stats[name].st_size,
+                        "mtime": stats[name].st_mtime,
+                        "has_md5": self.with_md5,
+                        "error": error,
+                        "entries": entries,
+                    }
+                    read += 1
+                    if cancel and cancel.is_set():
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        break
+            self.save()
+            print(f"Indexed {len(self.archives)} archives ({read} read, {len(stats) - len(stale)} cached)")
+
+        return self
+
+    def entries(self):
+        # Yields (archive name, entry) for every .osu member of every archive
+        for name, archive in self.archives.items():
+            for entry in archive["entries"]:
+                yield name, entry
+
+    def find_md5(self, md5_set):
+        return {entry["md5"]: (name, entry) for name, entry in self.entries() if entry["md5"] in md5_set}
@@ -0,0 +1,107 @@
+# Rebuilds .osz archives from mapset folders in Songs/
+# Members are stored (or lightly deflated) and streamed from disk straight into the archive,
+# one mapset per process, so packing a collection is bound by disk speed.
+
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from osu_library import profiling
+
+
+def _compression(level):
+    # 0 stores members as they are (audio and images barely compress anyway), 1-9 deflates
+    if not level:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, level
+
+
+def write_folder(zf, folder_path, level=0):
+    # Adds every file of a mapset folder to an open ZipFile, paths relative to the folder
+    compress_type, compresslevel = _compression(level)
+    written = 0
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            arcname = os.path.relpath(path, folder_path).replace(os.sep, "/")
+            zf.write(path, arcname, compress_type=compress_type, compresslevel=compresslevel)
+            written += os.path.getsize(path)
+    return written
+
+
+def pack_folder(folder_path, out_path, level=0):
+    tmp_path = out_path + ".packing"
+    with zipfile.ZipFile(tmp_path, "w") as zf:
+        written = write_folder(zf, folder_path, level)
+    os.replace(tmp_path, out_path)
+    return written
+
+
+def copy_archive(archive_path, out_path):
+    # Archives that are already in Exports/ are linked (or copied) as they are
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    try:
+        os.link(archive_path, out_path)
+    except OSError:
+        shutil.copyfile(archive_path, out_path)
+    return os.path.getsize(out_path)
+
+
+def _pack_job(args):
+    kind, source, out_path, level = args
+    try:
+        if kind == "archive":
+            return copy_archive(source, out_path), None
+        return pack_folder(source, out_path, level), None
+    except OSError as e:
+        return 0, f"{os.path.basename(source)}: {e}"
+
+
+def pack_mapsets(sources, out_dir, level=0, workers=None, on_progress=None):
+    # sources: {output name: ("folder" | "archive", path)}; writes one .osz per mapset into out_dir
+    # Returns (bytes written, [errors])
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(kind, path, os.path.join(out_dir, name), level) for name, (kind, path) in sources.items()]
+    written = 0
+    errors = []
+
+    with profiling.span("pack mapsets"), ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_pack_job, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            size, error = future.result()
+            written += size
+            if error:
+                errors.append(error)
+            if on_progress:
+                on_progress(done, len(jobs))
+
+    profiling.count("bytes packed", written)
+    return written, errors
+
+
+def bundle_mapsets(sources, bundle_path, level=0, on_progress=None):
+    # Same as pack_mapsets but every .osz is streamed into one stored zip, with no intermediate files.
+    # A single writer owns the bundle, so this runs in one process.
+    tmp_path = bundle_path + ".packing"
+    written = 0
+    errors = []
+
+    with profiling.span("bundle mapsets"), zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as bundle:
+        for done, (name, (kind, path)) in enumerate(sources.items(), 1):
+            try:
+                if kind == "archive":
+                    bundle.write(path, name)
+                    written += os.path.getsize(path)
+                else:
+                    with bundle.open(name, "w", force_zip64=True) as stream, zipfile.ZipFile(stream, "w") as osz:
+                        written += write_folder(osz, path, level)
+            except OSError as e:
+                errors.append(f"{os.path.basename(path)}: {e}")
+            if on_progress:
+                on_progress(done, len(sources))
+
+    os.replace(tmp_path, bundle_path)
+    profiling.count("bytes packed", written)
+    return written, errors
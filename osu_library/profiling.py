@@ -0,0 +1,210 @@
+# Opt-in timing spans, counters and profiler dumps for the library tools
+# Enabled with the OSU_PROFILE environment variable or a --profile[=mode] argument:
+#   spans     timing spans and counters, printed when the program exits
+#   cprofile  spans + cProfile stats dumped to osu_profile.prof
+#   sample    spans + a sampling profiler dumped to osu_profile.folded (flamegraph format)
+# When disabled, span() returns a shared no-op object and count() returns immediately.
+
+import os
+import sys
+import atexit
+import threading
+from time import perf_counter, sleep
+
+MODES = ("spans", "cprofile", "sample")
+PROFILE_FILE = "osu_profile.prof"
+SAMPLE_FILE = "osu_profile.folded"
+SAMPLE_INTERVAL = 0.005
+
+ENABLED = False
+MODE = None
+
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+_profiles = []
+_samples = {}
+_sampler_stop = threading.Event()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        with _lock:
+            calls, total = _spans.get(self.name, (0, 0.0))
+            _spans[self.name] = (calls + 1, total + elapsed)
+        return False
+
+
+def span(name):
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def count(name, amount=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+# -------------------- PROCESS POOLS --------------------
+
+class _PoolJob:
+    # Picklable wrapper run in a pool worker: returns (result, spans and counters the job added there)
+    __slots__ = ("func", "enabled")
+
+    def __init__(self, func, enabled):
+        self.func = func
+        self.enabled = enabled
+
+    def __call__(self, arg):
+        global ENABLED
+        if not self.enabled:
+            return self.func(arg), None
+
+        # A spawned worker starts disabled; a forked one starts with a copy of the parent's totals
+        ENABLED = True
+        with _lock:
+            spans_before = dict(_spans)
+            counters_before = dict(_counters)
+        result = self.func(arg)
+        with _lock:
+            spans = {}
+            for name, (calls, total) in _spans.items():
+                calls_before, total_before = spans_before.get(name, (0, 0.0))
+                if calls != calls_before:
+                    spans[name] = (calls - calls_before, total - total_before)
+            counters = {name: value - counters_before.get(name, 0) for name, value in _counters.items()
+                        if value != counters_before.get(name, 0)}
+        return result, (spans, counters)
+
+
+def pool_job(func):
+    # Wrap a ProcessPoolExecutor job with this and its results with merged(), or what it measures is lost
+    return _PoolJob(func, ENABLED)
+
+
+def merged(results):
+    # Yields the results of pool_job() jobs, adding their spans and counters to this process
+    for result, measured in results:
+        if measured:
+            spans, counters = measured
+            with _lock:
+                for name, (calls, total) in spans.items():
+                    calls_before, total_before = _spans.get(name, (0, 0.0))
+                    _spans[name] = (calls_before + calls, total_before + total)
+                for name, value in counters.items():
+                    _counters[name] = _counters.get(name, 0) + value
+        yield result
+
+
+# -------------------- PROFILERS --------------------
+
+def run(func, *args, **kwargs):
+    # Runs func under cProfile when that mode is on; use it for the main entry point and thread targets
+    if MODE != "cprofile":
+        return func(*args, **kwargs)
+
+    import cProfile
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(func, *args, **kwargs)
+    finally:
+        with _lock:
+            _profiles.append(profile)
+
+
+def _sampler():
+    own_id = threading.get_ident()
+    while not _sampler_stop.is_set():
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            with _lock:
+                _samples[key] = _samples.get(key, 0) + 1
+        sleep(SAMPLE_INTERVAL)
+
+
+# -------------------- REPORT --------------------
+
+def report():
+    if _spans or _counters:
+        print("\n=== Profile ===")
+        for name, (calls, total) in sorted(_spans.items(), key=lambda item: -item[1][1]):
+            print(f"{name:<28} {total:>10.3f}s  {calls:>8} calls  {total / calls * 1000:>9.3f} ms/call")
+        for name, value in sorted(_counters.items()):
+            print(f"{name:<28} {value:>10}")
+
+    if _profiles:
+        import pstats
+        stats = pstats.Stats(*_profiles)
+        stats.dump_stats(PROFILE_FILE)
+        print(f"cProfile stats saved to {os.path.abspath(PROFILE_FILE)}")
+
+    if MODE == "sample":
+        _sampler_stop.set()
+        with _lock:
+            samples = dict(_samples)
+        with open(SAMPLE_FILE, "w", encoding="utf-8") as f:
+            for stack, hits in samples.items():
+                f.write(f"{stack} {hits}\n")
+        print(f"Sampled stacks saved to {os.path.abspath(SAMPLE_FILE)}")
+
+
+def enable(mode="spans"):
+    global ENABLED, MODE
+    if ENABLED:
+        return
+    if mode not in MODES:
+        mode = "spans"
+
+    ENABLED = True
+    MODE = mode
+    if mode == "sample":
+        threading.Thread(target=_sampler, daemon=True).start()
+    atexit.register(report)
+
+
+def enable_from_env(argv=None):
+    # OSU_PROFILE=<mode> or a --profile / --profile=<mode> argument turns profiling on
+    argv = sys.argv if argv is None else argv
+    mode = os.environ.get("OSU_PROFILE")
+
+    for arg in argv[1:]:
+        if arg == "--profile":
+            mode = mode or "spans"
+        elif arg.startswith("--profile="):
+            mode = arg.split("=", 1)[1]
+
+    if mode and mode != "0":
+        enable(mode)
@@ -0,0 +1,168 @@
+# Watch mode for LibraryIndex: inotify on Linux, polling everywhere else
+# Only the mapset folders that were added, removed or modified are re-read.
+
+import os
+import sys
+import struct
+import select
+import ctypes
+import ctypes.util
+from time import monotonic, sleep
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+TOP_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_CLOSE_WRITE
+FOLDER_MASK = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct("iIII")
+SETTLE_TIME = 0.5
+
+
+class InotifyUnavailable(OSError):
+    pass
+
+
+class Inotify:
+    # Minimal ctypes binding, no third-party dependency
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise InotifyUnavailable("inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise InotifyUnavailable(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise InotifyUnavailable(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self, timeout):
+        # Yields (wd, mask, name) for every event available within timeout seconds
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _apply(index, dirty_folders, archives_dirty, full_refresh):
+    changed = False
+    if full_refresh:
+        before = index.version
+        index.refresh()
+        return index.version != before
+
+    for name in dirty_folders:
+        changed |= index.update_folder(name)
+    if archives_dirty:
+        before = index.version
+        index.refresh_archives()
+        changed |= index.version != before
+
+    if changed:
+        index.save()
+        print(f"Library index updated: {len(dirty_folders)} folders, archives {'changed' if archives_dirty else 'unchanged'}")
+    return changed
+
+
+def watch_inotify(index, on_change=None, stop=None):
+    inotify = Inotify()
+    folders_by_wd = {}
+
+    try:
+        songs_wd = inotify.add_watch(index.songs_dir, TOP_MASK)
+        exports_wd = inotify.add_watch(index.exports_dir, TOP_MASK) if os.path.isdir(index.exports_dir) else None
+
+        # One watch per mapset folder; running out of watches (ENOSPC) falls back to polling
+        with os.scandir(index.songs_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    folders_by_wd[inotify.add_watch(entry.path, FOLDER_MASK)] = entry.name
+
+        print(f"Watching {len(folders_by_wd)} mapset folders with inotify")
+        dirty = set()
+        archives_dirty = False
+        full_refresh = False
+        last_event = None
+
+        while not (stop and stop.is_set()):
+            for wd, mask, name in inotify.read_events(SETTLE_TIME):
+                last_event = monotonic()
+
+                if mask & IN_Q_OVERFLOW:
+                    full_refresh = True
+                elif wd == songs_wd:
+                    if mask & IN_ISDIR:
+                        dirty.add(name)
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            folders_by_wd[inotify.add_watch(os.path.join(index.songs_dir, name), FOLDER_MASK)] = name
+                elif exports_wd is not None and wd == exports_wd:
+                    if name.lower().endswith(".osz"):
+                        archives_dirty = True
+                elif mask & IN_IGNORED:
+                    folders_by_wd.pop(wd, None)
+                elif wd in folders_by_wd and (name.endswith(".osu") or mask & IN_DELETE_SELF):
+                    dirty.add(folders_by_wd[wd])
+
+            # Changes are applied once the folder has been quiet for SETTLE_TIME (osu! imports in bursts)
+            if last_event and monotonic() - last_event >= SETTLE_TIME:
+                try:
+                    changed = _apply(index, dirty, archives_dirty, full_refresh)
+                except OSError as e:
+                    # Files still moving under us: keep the pending changes and retry once it settles again
+                    print(f"Library index update failed ({e}), retrying")
+                    last_event = monotonic()
+                    continue
+                if changed and on_change:
+                    on_change(index)
+                dirty = set()
+                archives_dirty = full_refresh = False
+                last_event = None
+    finally:
+        inotify.close()
+
+
+def watch_polling(index, interval=2.0, on_change=None, stop=None):
+    print(f"Polling the library every {interval}s")
+    while not (stop and stop.is_set()):
+        sleep(interval)
+        before = index.version
+        try:
+            index.refresh()
+        except OSError as e:
+            print(f"Library refresh failed ({e}), retrying in {interval}s")
+            continue
+        if index.version != before and on_change:
+            on_change(index)
+
+
+def watch(index, interval=2.0, use_inotify=True, on_change=None, stop=None):
+    # Blocks until stop is set (or forever); index stays current the whole time
+    if use_inotify:
+        try:
+            return watch_inotify(index, on_change, stop)
+        except InotifyUnavailable as e:
+            print(f"inotify unavailable ({e}), falling back to polling")
+    return watch_polling(index, interval, on_change, stop)